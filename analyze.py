@@ -0,0 +1,202 @@
+"""
+Score an archive of captured frames offline
+
+Walks a directory tree, decodes and letterboxes images in a process pool,
+runs them through VehicleDetector in batches and streams one row per image
+(class counts and weight) to CSV or Parquet. Images already in the output
+are skipped, so an interrupted run picks up where it stopped; delete the
+output to start over:
+
+    python analyze.py captures/2024-05 --output may.csv
+    python analyze.py captures/2024-05 --output may_parquet/ --format parquet --workers 8
+    python analyze.py captures/2024-05 --output may.csv --detector yolov5s --batch-size 32
+
+Parquet output is a directory of part files (one per flush) and needs
+pyarrow.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from config import DETECTION_CONF_THRESHOLD, IMAGE_EXTS, LOG_LEVEL
+from frame_store import load_for_inference
+
+logger = logging.getLogger("analyze")
+
+
+def find_images(root):
+    """Every image under root, in a stable order"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTS):
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+class CsvSink:
+    def __init__(self, path, columns):
+        self.path = Path(path)
+        self.columns = columns
+        exists = self.path.exists() and self.path.stat().st_size > 0
+        self._file = open(self.path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=columns)
+        if not exists:
+            self._writer.writeheader()
+
+    @staticmethod
+    def done(path):
+        path = Path(path)
+        if not path.exists():
+            return set()
+        with open(path, newline="") as f:
+            return {row["path"] for row in csv.DictReader(f)}
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """One part file per flush, so rows are durable without rewriting earlier parts"""
+
+    def __init__(self, path, columns, rows_per_part=5000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise SystemExit("Parquet output requires pyarrow") from e
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self.rows_per_part = rows_per_part
+        self._pending = []
+        self._part = len(list(self.path.glob("part-*.parquet")))
+
+    @staticmethod
+    def done(path):
+        path = Path(path)
+        if not path.is_dir():
+            return set()
+        import pyarrow.parquet as pq
+        done = set()
+        for part in path.glob("part-*.parquet"):
+            done.update(pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return done
+
+    def write(self, rows):
+        self._pending.extend(rows)
+        if len(self._pending) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        table = self.pa.table({c: [row[c] for row in self._pending] for c in self.columns})
+        self.pq.write_table(table, self.path / f"part-{self._part:05d}.parquet")
+        self._part += 1
+        self._pending = []
+
+    def close(self):
+        self._flush()
+
+
+def decoded_batches(paths, size, workers, batch_size):
+    """Yield lists of (path, image) in order, keeping a bounded number of decodes in flight"""
+    # Spawned, not forked: forking after torch has started its thread pools can hang
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        in_flight = deque()
+        remaining = iter(paths)
+        batch = []
+        while True:
+            while len(in_flight) < workers * 4:
+                path = next(remaining, None)
+                if path is None:
+                    break
+                in_flight.append(pool.submit(load_for_inference, path, size))
+            if not in_flight:
+                break
+            batch.append(in_flight.popleft().result())
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-score an archive of captured frames")
+    parser.add_argument("root", type=Path, help="Directory tree of images")
+    parser.add_argument("--output", type=Path, required=True, help="CSV file, or directory for Parquet parts")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="Default: from the output suffix")
+    parser.add_argument("--detector", default="yolov5l", help="Model name from the local registry, or 'stub'")
+    parser.add_argument("--optimized", action="store_true", help="Use the quantized / channels-last variant")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1), help="Decode processes")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--conf", type=float, default=DETECTION_CONF_THRESHOLD)
+    args = parser.parse_args()
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    fmt = args.format or ("csv" if args.output.suffix.lower() == ".csv" else "parquet")
+    sink_cls = CsvSink if fmt == "csv" else ParquetSink
+
+    paths = find_images(args.root)
+    done = sink_cls.done(args.output)
+    if done:
+        paths = [p for p in paths if p not in done]
+        logger.info(f"Resuming: {len(done)} images already scored")
+    if not paths:
+        logger.info("Nothing to do")
+        return
+
+    # Imported here so the spawned decode workers, which import this
+    # module, never load torch
+    from benchmark import build_detector
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = build_detector(args.detector, 0.0, args.optimized)
+    class_names = list(detector.class_names.values())
+    sink = sink_cls(args.output, ["path", "weight", "error"] + class_names)
+
+    logger.info(f"Scoring {len(paths)} images with {detector.model_variant} using {args.workers} decode workers")
+    start = time.perf_counter()
+    scored = 0
+    try:
+        for batch in decoded_batches(paths, detector.input_size, args.workers, args.batch_size):
+            rows = []
+            detections = detector.infer([image for _, image in batch])
+            for (path, _), det in zip(batch, detections):
+                row = {"path": path, "weight": None, "error": None, **{name: 0 for name in class_names}}
+                if det is None:
+                    row["error"] = "unreadable"
+                else:
+                    details, row["weight"] = detector.summarize(det, args.conf)
+                    row.update(details)
+                rows.append(row)
+            sink.write(rows)
+
+            scored += len(batch)
+            if scored % (args.batch_size * 50) < args.batch_size:
+                rate = scored / (time.perf_counter() - start)
+                logger.info(f"{scored}/{len(paths)} images, {rate:.1f} images/s")
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} images/s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,92 @@
-from flask import Flask, jsonify, request, send_file, send_from_directory
+from flask import Flask, Response, abort, g, jsonify, make_response, request, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
+import json
+import logging
 import threading
 import time
 import os
 from pathlib import Path
-from main import TrafficSystem
-from config import BASE_DIR, INPUT_DIR, INPRO_DIR, EXIT_DIR, create_dirs
+from intersections import IntersectionHost
+from frame_store import decode_image, encode_jpeg
+from debug_store import DebugImageStore
+from inference_service import QueueFullError
+from config import BASE_DIR, DEBUG_IMAGE_DIR, DEFAULT_INTERSECTION, INTERSECTIONS, LOG_LEVEL, SERVE_CONTROL_ADDRESS, SERVE_INFERENCE_ADDRESS, create_dirs
+import metrics
 import uuid  # For generating unique filenames
-from glob import glob
 from datetime import datetime, timedelta
 
 
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Configure debug image folder
-DEBUG_IMAGE_FOLDER = os.path.join(BASE_DIR, 'debug_images')
+DEBUG_IMAGE_FOLDER = str(DEBUG_IMAGE_DIR)
 os.makedirs(DEBUG_IMAGE_FOLDER, exist_ok=True)
 
 # Configuration
 DEBUG_IMAGE_RETENTION = timedelta(hours=1)  # Keep images for 1 hour
 MAX_DEBUG_IMAGES = 50  # Maximum number of debug images to keep
+DEBUG_SWEEP_INTERVAL = 60  # Seconds between background cleanups of expired images
+STREAM_KEEPALIVE_SECONDS = 15  # Comment line sent to idle /stream clients
+DEBUG_RETRY_AFTER_SECONDS = 1  # Retry-After for /debug when the inference queue is full
+
+# Debug images are indexed in memory and pruned by a background janitor
+debug_store = DebugImageStore(
+    DEBUG_IMAGE_FOLDER, DEBUG_IMAGE_RETENTION.total_seconds(), MAX_DEBUG_IMAGES, DEBUG_SWEEP_INTERVAL
+)
+debug_store.start()
 
-# Initialize the traffic system and directories
-system = TrafficSystem()
+# Initialize the directories and every configured intersection; under
+# serve.py they live in the control process and this is an HTTP worker
 create_dirs()
+if os.environ.get("ITMS_SERVE_AUTHKEY"):
+    from control_server import RemoteHost
+    host = RemoteHost(SERVE_CONTROL_ADDRESS, SERVE_INFERENCE_ADDRESS, bytes.fromhex(os.environ["ITMS_SERVE_AUTHKEY"]))
+else:
+    host = IntersectionHost(INTERSECTIONS)
+
+def route(rule, **options):
+    """Register a view for one intersection
+
+    The view is served at /intersections/<iid><rule>, and at the bare rule
+    for the default intersection so existing clients keep working.
+    """
+    def decorator(view):
+        app.route(rule, defaults={"iid": DEFAULT_INTERSECTION}, **options)(view)
+        app.route(f"/intersections/<iid>{rule}", **options)(view)
+        return view
+    return decorator
 
-@app.route('/start', methods=['POST'])
-def start_system():
+def lookup(iid):
+    system = host.get(iid)
+    if system is None:
+        abort(make_response(jsonify({
+            "status": "error",
+            "message": f"Unknown intersection: {iid}"
+        }), 404))
+    return system
+
+@app.route('/intersections', methods=['GET'])
+def list_intersections():
+    """Hosted intersections and whether each one is running"""
+    return jsonify({
+        "intersections": [
+            {
+                "id": iid,
+                "lanes": system.lane_count,
+                "system_status": "running" if system.is_running else "stopped"
+            }
+            for iid, system in host
+        ],
+        "default": DEFAULT_INTERSECTION
+    })
+
+@route('/start', methods=['POST'])
+def start_system(iid):
     """Endpoint to start the traffic management system"""
+    system = lookup(iid)
     if system.is_running:
         return jsonify({
             "status": "error",
@@ -36,6 +94,13 @@ def start_system():
             "system_status": "running"
         }), 400
 
+    if not system.detector.is_ready:
+        return jsonify({
+            "status": "error",
+            "message": system.detector.load_error or "Model is still loading",
+            "system_status": "stopped"
+        }), 503
+
     # Start in a separate thread to avoid blocking
     def run_system():
         system.start_system()
@@ -50,9 +115,10 @@ def start_system():
         "system_status": "running"
     })
 
-@app.route('/stop', methods=['POST'])
-def stop_system():
+@route('/stop', methods=['POST'])
+def stop_system(iid):
     """Endpoint to stop the traffic management system"""
+    system = lookup(iid)
     if not system.is_running:
         return jsonify({
             "status": "error",
@@ -67,23 +133,137 @@ def stop_system():
         "system_status": "stopped"
     })
 
-@app.route('/status', methods=['GET'])
-def get_status():
-    """Debug version of status endpoint"""
-    status = {
-        "lane_status": system.get_lane_status(),
-        "system_status": "running" if system.is_running else "stopped",
-        "time_remain": system.lane_time,
-        "current_lane": system.green_lane,
-        "yellow_lanes": system.yellow_lanes,
-        "vehicle_counts": system.count_lane_vehicles() if system.is_running else []
-    }
-    print("DEBUG - Status payload:", status)  # Add this line
-    return jsonify(status)
-
-@app.route('/debug', methods=['POST'])
-def debug_image():
-    """Endpoint for debugging vehicle detection with image display"""
+@route('/status', methods=['GET'])
+def get_status(iid):
+    """Current status, with an ETag so unchanged polls get 304 Not Modified"""
+    snapshot = lookup(iid).snapshot
+    response = Response(snapshot.body, mimetype="application/json")
+    response.set_etag(snapshot.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@route('/stream', methods=['GET'])
+def stream_status(iid):
+    """Server-Sent Events stream of status changes
+
+    Sends a full "snapshot" event on connect, then a "delta" event holding
+    only the fields that changed whenever the system state changes (every
+    second while the countdown runs).
+    """
+    system = lookup(iid)
+
+    def events():
+        snapshot = system.snapshot
+        version, last = snapshot.version, snapshot.status
+        yield f"event: snapshot\ndata: {snapshot.body.decode()}\n\n"
+
+        while True:
+            new_version = system.wait_for_state_change(version, timeout=STREAM_KEEPALIVE_SECONDS)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            snapshot = system.snapshot
+            version, status = snapshot.version, snapshot.status
+            delta = {k: v for k, v in status.items() if last.get(k) != v}
+            last = status
+            if delta:
+                yield f"event: delta\ndata: {json.dumps(delta)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def parse_time(value, default):
+    """Epoch seconds or an ISO 8601 timestamp"""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@route('/history', methods=['GET'])
+def get_history(iid):
+    """Recorded lane counts or phase changes over a time range
+
+    Query parameters: kind (counts or phases), start and end (epoch seconds
+    or ISO 8601; default the last hour), step (bucket size in seconds to
+    downsample), lane and limit.
+    """
+    system = lookup(iid)
+    if system.history is None:
+        return jsonify({
+            "status": "error",
+            "message": "History is disabled"
+        }), 404
+
+    try:
+        end = parse_time(request.args.get('end'), time.time())
+        start = parse_time(request.args.get('start'), end - 3600)
+        step = request.args.get('step', type=float)
+        lane = request.args.get('lane', type=int)
+        limit = request.args.get('limit', 10000, type=int)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid time range: {e}"
+        }), 400
+    if step is not None and step <= 0:
+        return jsonify({
+            "status": "error",
+            "message": "step must be positive"
+        }), 400
+
+    kind = request.args.get('kind', 'counts')
+    if kind == 'counts':
+        rows = system.history.query_counts(system.name, start, end, step, lane, limit)
+    elif kind == 'phases':
+        rows = system.history.query_phases(system.name, start, end, step, lane, limit)
+    else:
+        return jsonify({
+            "status": "error",
+            "message": "kind must be 'counts' or 'phases'"
+        }), 400
+
+    return jsonify({
+        "kind": kind,
+        "start": start,
+        "end": end,
+        "step": step,
+        "rows": rows
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(host.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            endpoint=request.endpoint or "unknown",
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+@route('/debug', methods=['POST'])
+def debug_image(iid):
+    """Endpoint for debugging vehicle detection with image display
+
+    With ?inline=1 the annotated image is returned directly as a JPEG
+    encoded in memory, and nothing is written to disk.
+    """
+    system = lookup(iid)
     if 'image' not in request.files:
         return jsonify({
             "status": "error",
@@ -96,17 +276,21 @@ def debug_image():
         original_filename = request.files['image'].filename
         file_ext = os.path.splitext(original_filename)[1]
         
-         # Create paths
-        debug_filename = f"debug_{unique_id}{file_ext}"
-        debug_path = os.path.join(DEBUG_IMAGE_FOLDER, debug_filename)
-        
-        # Process the image (assuming system.debug_detection exists)
-        processed_filename = f"processed_{unique_id}{file_ext}"
-        processed_path = os.path.join(DEBUG_IMAGE_FOLDER, processed_filename)
+        # Decode the upload in memory instead of saving it and reading it back
+        image = decode_image(request.files['image'].read())
+        if image is None:
+            return jsonify({
+                "status": "error",
+                "message": "Could not decode image"
+            }), 400
+
+        if request.args.get('inline') in ('1', 'true'):
+            annotated = system.debug_detection(image)
+            return Response(encode_jpeg(annotated), mimetype='image/jpeg')
 
-        # Save the uploaded image
-        request.files['image'].save(debug_path)
-        system.debug_detection(debug_path, processed_path)
+        processed_filename = f"processed_{unique_id}{file_ext}"
+        system.debug_detection(image, str(debug_store.path_for(processed_filename)))
+        debug_store.add(processed_filename)
         
         # Return URL to access the processed image
         return jsonify({
@@ -114,7 +298,15 @@ def debug_image():
             "original_filename": original_filename,
             "processed_url": f"/debug_images/{processed_filename}"
         })
-        
+
+    except QueueFullError as e:
+        # Lane scoring has priority; tell the client to back off instead of queueing
+        response = jsonify({
+            "status": "error",
+            "message": str(e)
+        })
+        response.headers['Retry-After'] = str(DEBUG_RETRY_AFTER_SECONDS)
+        return response, 429
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -133,51 +325,10 @@ def view_debug():
     debug_path = str(BASE_DIR / "debug.jpg")
     return send_file(debug_path, mimetype='image/jpeg')
 
-@app.teardown_request
-def cleanup_debug_images(exception=None):
-    """Clean up debug images based on age and quantity"""
-    try:
-        now = datetime.now()
-        debug_images = []
-        
-        # Collect all debug images with their timestamps
-        for pattern in ['debug_*.*', 'processed_*.*']:
-            for image_path in glob(os.path.join(DEBUG_IMAGE_FOLDER, pattern)):
-                try:
-                    mtime = datetime.fromtimestamp(os.path.getmtime(image_path))
-                    debug_images.append((image_path, mtime))
-                except Exception as e:
-                    app.logger.error(f"Could not get mtime for {image_path}: {str(e)}")
-                    continue
-        
-        # Sort by modification time (oldest first)
-        debug_images.sort(key=lambda x: x[1])
-        
-        # Cleanup based on age
-        for image_path, mtime in debug_images:
-            if now - mtime > DEBUG_IMAGE_RETENTION:
-                try:
-                    os.remove(image_path)
-                    app.logger.info(f"Cleaned up old debug image: {image_path}")
-                except Exception as e:
-                    app.logger.error(f"Failed to delete {image_path}: {str(e)}")
-        
-        # Cleanup based on quantity (if we have too many)
-        if len(debug_images) > MAX_DEBUG_IMAGES:
-            for image_path, _ in debug_images[:len(debug_images) - MAX_DEBUG_IMAGES]:
-                try:
-                    os.remove(image_path)
-                    app.logger.info(f"Cleaned up excess debug image: {image_path}")
-                except Exception as e:
-                    app.logger.error(f"Failed to delete {image_path}: {str(e)}")
-                    
-    except Exception as e:
-        app.logger.error(f"Error during debug image cleanup: {str(e)}")
-
-@app.route('/reset', methods=['POST'])
-def reset_system():
+@route('/reset', methods=['POST'])
+def reset_system(iid):
     """Endpoint to manually reset the system"""
-    success = system.reset_input_folder()
+    success = lookup(iid).reset_input_folder()
     return jsonify({
         "status": "success" if success else "error",
         "message": "System reset completed" if success else "No images to reset",
@@ -0,0 +1,264 @@
+"""
+Offline benchmark for the detection and control pipeline
+
+Runs the sample images through decode, preprocessing, inference,
+post-processing, file moves and the TrafficSystem entry points
+(count_lane_vehicles, lane_calc, get_detailed_counts, debug_detection),
+then writes per-stage latency percentiles, throughput and peak RSS as JSON.
+
+    python benchmark.py                          # stub detector, no weights needed
+    python benchmark.py --detector yolov5s       # local artifact from models/
+    python benchmark.py --detector yolov5l --iterations 50 --output l.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+import model_registry
+from config import BASE_DIR, INPUT_DIR, IMAGE_EXTS
+from detections import Detections
+from frame_store import decode_image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class StageTimer:
+    """Collects latency samples (ms) per named stage"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        yield
+        self.samples[stage].append((time.perf_counter() - start) * 1e3)
+
+    def add(self, stage, ms):
+        self.samples[stage].append(ms)
+
+    def summary(self):
+        return {stage: summarize_ms(values) for stage, values in self.samples.items()}
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize_ms(values):
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p90_ms": round(percentile(ordered, 90), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_detector(name, stub_latency, optimized=False, cascade=None):
+    # Benchmarks must never reach for the network
+    model_registry.ALLOW_HUB_DOWNLOAD = False
+    if name == "stub":
+        from stub_detector import StubDetector
+        return StubDetector(latency=stub_latency, optimized=optimized, cascade=cascade)
+
+    from vehicle_detector import VehicleDetector
+    detector = VehicleDetector(model_name=name, background=False, optimized=optimized, cascade=cascade)
+    if not detector.is_ready:
+        raise SystemExit(f"Could not load {name}: {detector.load_error}")
+    return detector
+
+
+def bench_io(images, timer, workdir):
+    """Raw file moves and JPEG decode, independent of any model"""
+    src_dir, dst_dir = workdir / "src", workdir / "dst"
+    src_dir.mkdir()
+    dst_dir.mkdir()
+    for img in images:
+        shutil.copy(img, src_dir / img.name)
+
+    for img in images:
+        with timer.time("file_move"):
+            shutil.move(str(src_dir / img.name), str(dst_dir / img.name))
+        shutil.move(str(dst_dir / img.name), str(src_dir / img.name))
+
+    frames = []
+    for img in images:
+        with timer.time("decode"):
+            frame = decode_image((src_dir / img.name).read_bytes())
+        frames.append(frame)
+    return frames
+
+
+def bench_model(detector, frames, iterations, batch_size, timer):
+    """Per-stage model timings plus end-to-end detect_batch throughput"""
+    batches = [[frames[(i * batch_size + j) % len(frames)] for j in range(batch_size)] for i in range(iterations)]
+
+    for batch in batches:
+        results = detector.model(batch)
+        pre, inf, nms = results.t
+        timer.add("preprocess", pre)
+        timer.add("inference", inf)
+        timer.add("nms", nms)
+        for det in results.xyxy:
+            with timer.time("postprocess"):
+                detector.summarize(Detections.from_xyxy(det))
+
+    start = time.perf_counter()
+    for batch in batches:
+        with timer.time("detect_batch"):
+            detector.detect_batch(batch)
+    elapsed = time.perf_counter() - start
+    return len(batches) * batch_size / elapsed if elapsed else 0.0
+
+
+def bench_system(detector, images, iterations, timer, workdir):
+    """TrafficSystem entry points with lanes pointed at the sample images"""
+    from main import TrafficSystem
+
+    system = TrafficSystem(detector=detector, cache_db_path=None)
+    # Cold timings must run the model every time
+    system.motion_gate = None
+    lanes = {i: images[(i - 1) % len(images)] for i in range(1, 5)}
+
+    def point_lanes():
+        system.frames.clear()
+        system.lane_images = dict(lanes)
+
+    for _ in range(iterations):
+        point_lanes()
+        system.detection_cache.clear()
+        with timer.time("count_lane_vehicles_cold"):
+            system.count_lane_vehicles()
+        with timer.time("count_lane_vehicles_cached"):
+            system.count_lane_vehicles()
+        with timer.time("lane_calc_cached"):
+            system.lane_calc()
+
+    for i in range(iterations):
+        system.detection_cache.clear()
+        with timer.time("get_detailed_counts"):
+            system.get_detailed_counts(images[i % len(images)])
+
+    output = str(workdir / "debug_out.jpg")
+    for i in range(iterations):
+        image = decode_image(images[i % len(images)].read_bytes())
+        with timer.time("debug_detection"):
+            system.debug_detection(image, output)
+
+    system.intake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline detection/control pipeline benchmark")
+    parser.add_argument("--detector", default="stub", help="'stub' or a model name from the local registry (e.g. yolov5s, yolov5l)")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Simulated inference seconds per image for the stub")
+    parser.add_argument("--optimized", action="store_true", help="Load the quantized / channels-last variant")
+    parser.add_argument("--cascade", help="First-stage model (e.g. yolov5s) to run in front of --detector")
+    parser.add_argument("--images", type=Path, default=INPUT_DIR, help="Directory of sample images")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--output", type=Path, help="JSON results path (default: bench_results/<detector>_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    images = sorted(f for f in args.images.iterdir() if f.suffix.lower() in IMAGE_EXTS)
+    if not images:
+        raise SystemExit(f"No sample images in {args.images}")
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            frames = bench_io(images, timer, workdir)
+            load_start = time.perf_counter()
+            detector = build_detector(args.detector, args.stub_latency, args.optimized, args.cascade)
+            timer.add("model_load", (time.perf_counter() - load_start) * 1e3)
+            detect_ips = bench_model(detector, frames, args.iterations, args.batch_size, timer)
+            bench_system(detector, images, args.iterations, timer, workdir)
+
+    stages = timer.summary()
+    decode_ms = sum(timer.samples["decode"])
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "detector": args.detector,
+            "optimized": args.optimized,
+            "cascade": args.cascade,
+            "stub_latency": args.stub_latency if args.detector == "stub" else None,
+            "images": len(images),
+            "iterations": args.iterations,
+            "batch_size": args.batch_size,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "stages": stages,
+        "throughput": {
+            "detect_batch_images_per_sec": round(detect_ips, 2),
+            "decode_images_per_sec": round(len(images) * 1e3 / decode_ms, 2) if decode_ms else None,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if detector.cascade:
+        report["cascade"] = {"frames": dict(detector.cascade_counts), "escalation_rate": round(detector.escalation_rate, 3)}
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = BASE_DIR / "bench_results" / f"{detector.model_variant}_{report['meta']['commit'] or 'nogit'}_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'stage':<28}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'n':>6}")
+    for stage, s in stages.items():
+        print(f"{stage:<28}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['count']:>6}")
+    print(f"\ndetect_batch: {report['throughput']['detect_batch_images_per_sec']} images/sec")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+    if detector.cascade:
+        print(f"cascade escalation rate: {report['cascade']['escalation_rate']}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Compare the fp32 model with the optimized (INT8 / channels-last) variant
+
+Runs both variants over a local image set and reports per-image latency,
+how far the per-image weights from get_detailed_counts diverge, and how
+often lane_calc picks a different lane or green time. Every window of
+four consecutive images is treated as one intersection snapshot.
+
+    python compare_inference.py --detector yolov5l
+    python compare_inference.py --detector yolov5s --threads 4 --images captures/
+
+Exits non-zero when more lane decisions differ than --max-lane-mismatches
+(default 0), so it can gate turning OPTIMIZED_INFERENCE on.
+"""
+import argparse
+import contextlib
+import io
+import json
+from datetime import datetime
+from pathlib import Path
+
+from benchmark import StageTimer, build_detector, git_commit, peak_rss_mb
+from config import BASE_DIR, INPUT_DIR, IMAGE_EXTS
+from frame_store import decode_image
+from main import TrafficSystem
+from model_registry import configure_threads
+
+VARIANTS = ("fp32", "optimized")
+
+
+def run_variant(detector, images, frames, iterations, timer, stage, lanes=4):
+    """Latency per image, then weights and lane decisions through a TrafficSystem"""
+    for _ in range(iterations):
+        for frame in frames:
+            with timer.time(stage):
+                detector.detect_batch([frame])
+
+    system = TrafficSystem(detector=detector, cache_db_path=None, input_dir=images[0].parent, keep_audit_trail=False)
+    # Every decision must come from this variant's own detections
+    system.motion_gate = None
+    results = [system.get_detailed_counts(img) for img in images]
+
+    decisions = []
+    for start in range(len(images) - lanes + 1):
+        system.frames.clear()
+        system.lane_images = {lane: images[start + lane - 1] for lane in range(1, lanes + 1)}
+        decisions.append(system.lane_calc())
+    system.intake.stop()
+    return results, decisions
+
+
+def compare(images, baseline, optimized):
+    (base_results, base_decisions), (opt_results, opt_decisions) = baseline, optimized
+
+    per_image = []
+    for img, (base_details, base_weight), (opt_details, opt_weight) in zip(images, base_results, opt_results):
+        per_image.append({
+            "image": img.name,
+            "fp32_weight": base_weight,
+            "optimized_weight": opt_weight,
+            "weight_diff": round(opt_weight - base_weight, 3),
+            "counts_match": base_details == opt_details,
+        })
+
+    diffs = [abs(row["weight_diff"]) for row in per_image]
+    lane_mismatches = [
+        {"window": i, "fp32": list(base), "optimized": list(opt)}
+        for i, (base, opt) in enumerate(zip(base_decisions, opt_decisions))
+        if base[0] != opt[0]
+    ]
+    time_mismatches = sum(1 for base, opt in zip(base_decisions, opt_decisions) if base[1] != opt[1])
+
+    return {
+        "weights": {
+            "images": len(per_image),
+            "mean_abs_diff": round(sum(diffs) / len(diffs), 3) if diffs else 0.0,
+            "max_abs_diff": max(diffs, default=0.0),
+            "count_mismatches": sum(1 for row in per_image if not row["counts_match"]),
+        },
+        "lane_decisions": {
+            "windows": len(base_decisions),
+            "lane_mismatches": len(lane_mismatches),
+            "green_time_mismatches": time_mismatches,
+            "mismatched_windows": lane_mismatches,
+        },
+        "per_image": per_image,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 vs optimized inference: latency and lane decision divergence")
+    parser.add_argument("--detector", default="yolov5l", help="Model name from the local registry, or 'stub'")
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    parser.add_argument("--images", type=Path, default=INPUT_DIR, help="Directory of sample images")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed passes over the image set per variant")
+    parser.add_argument("--threads", type=int, help="Intra-op threads for both variants")
+    parser.add_argument("--interop-threads", type=int, help="Inter-op threads for both variants")
+    parser.add_argument("--max-lane-mismatches", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="JSON results path (default: bench_results/compare_<detector>_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    images = sorted(f for f in args.images.iterdir() if f.suffix.lower() in IMAGE_EXTS)
+    if len(images) < 4:
+        raise SystemExit(f"Need at least 4 sample images in {args.images}")
+    frames = [decode_image(img.read_bytes()) for img in images]
+
+    configure_threads(args.threads, args.interop_threads)
+    timer = StageTimer()
+    runs = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for variant in VARIANTS:
+            detector = build_detector(args.detector, args.stub_latency, optimized=variant == "optimized")
+            runs[variant] = run_variant(detector, images, frames, args.iterations, timer, variant)
+
+    latency = timer.summary()
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "detector": args.detector,
+            "images": len(images),
+            "iterations": args.iterations,
+            "threads": args.threads,
+            "interop_threads": args.interop_threads,
+        },
+        "latency": latency,
+        "speedup": round(latency["fp32"]["mean_ms"] / latency["optimized"]["mean_ms"], 2) if latency["optimized"]["mean_ms"] else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    report.update(compare(images, runs["fp32"], runs["optimized"]))
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = BASE_DIR / "bench_results" / f"compare_{args.detector}_{report['meta']['commit'] or 'nogit'}_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'variant':<12}{'p50 ms':>10}{'p90 ms':>10}{'mean ms':>10}")
+    for variant in VARIANTS:
+        s = latency[variant]
+        print(f"{variant:<12}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}{s['mean_ms']:>10.2f}")
+    print(f"\nspeedup: {report['speedup']}x")
+    weights, decisions = report["weights"], report["lane_decisions"]
+    print(f"weight diff: mean {weights['mean_abs_diff']}, max {weights['max_abs_diff']}, "
+          f"{weights['count_mismatches']}/{weights['images']} images with different counts")
+    print(f"lane decisions: {decisions['lane_mismatches']}/{decisions['windows']} different lanes, "
+          f"{decisions['green_time_mismatches']} different green times")
+    print(f"Results written to {output}")
+
+    if decisions["lane_mismatches"] > args.max_lane_mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,114 @@ BASE_DIR = Path(__file__).parent
 INPUT_DIR = BASE_DIR / "input_imgs"
 INPRO_DIR = BASE_DIR / "inpro_imgs"
 EXIT_DIR = BASE_DIR / "exit_imgs"
+# Annotated images written by POST /debug
+DEBUG_IMAGE_DIR = BASE_DIR / "debug_images"
+
+# Logging level for the server and control loop (DEBUG shows per-lane counts)
+LOG_LEVEL = "INFO"
+
+# Image intake: accepted file types and the rescan interval used when
+# inotify is unavailable
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+INTAKE_POLL_INTERVAL = 1.0
+
+# Video stream intake: bind lanes to a camera device index, a video file
+# (played in a loop) or a stream URL, e.g.
+#   {1: "rtsp://10.0.0.11/stream1", 2: 0, 3: "videos/lane3.mp4", 4: "http://localhost:8081/lane4.mjpg"}
+# Lanes then always score the newest frame instead of images from
+# input_imgs. At most STREAM_SAMPLE_FPS frames per second are decoded per
+# source, and a frame older than STREAM_MAX_FRAME_AGE seconds counts as
+# missing.
+LANE_STREAMS = {}
+STREAM_SAMPLE_FPS = 5.0
+STREAM_MAX_FRAME_AGE = 5.0
+STREAM_RECONNECT_DELAY = 2.0
+STREAM_START_TIMEOUT = 10.0
+
+# Per-lane regions of interest: a polygon in normalized image coordinates
+# ((0, 0) top-left, (1, 1) bottom-right) covering the lane's approach, e.g.
+#   {1: [(0.30, 1.0), (0.45, 0.35), (0.60, 0.35), (0.80, 1.0)]}
+# The detector only sees the polygon's bounding box, and only vehicles
+# inside the polygon count. Lanes without an entry use the whole frame.
+LANE_ROIS = {}
+
+# Motion gate: a lane frame whose 32x32 grayscale thumbnail differs from
+# the lane's last scored frame by less than this mean fraction of full
+# scale reuses the previous result instead of running the model. At most
+# MOTION_GATE_MAX_SKIPS results are reused in a row. Off (0) by default;
+# e.g. 0.02 turns it on.
+MOTION_GATE_THRESHOLD = 0
+MOTION_GATE_MAX_SKIPS = 20
+
+# Move lane images through inpro_imgs/ and exit_imgs/ as an audit trail.
+# Frames are decoded once and kept in memory either way; with this off the
+# files are left where they arrived and nothing is written to disk.
+KEEP_AUDIT_TRAIL = True
+
+# Minimum confidence for a detection to count towards a lane's weight
+DETECTION_CONF_THRESHOLD = 0.20
+
+# Detection cache: number of results kept in memory, and an optional
+# on-disk store (set to None to keep the cache in memory only)
+CACHE_MAX_ENTRIES = 256
+CACHE_DB_PATH = BASE_DIR / "detection_cache.db"
+
+# History of lane counts and phase changes, buffered in memory and written
+# to SQLite every HISTORY_FLUSH_INTERVAL seconds (None disables it). At most
+# HISTORY_BUFFER_SIZE records are held between flushes.
+HISTORY_DB_PATH = BASE_DIR / "history.db"
+HISTORY_FLUSH_INTERVAL = 5.0
+HISTORY_BUFFER_SIZE = 10000
+
+# Model registry: exported artifacts (<name>.torchscript/.onnx/.pt) live in
+# MODELS_DIR. .pt weights need a local clone of ultralytics/yolov5 to load
+# offline; torch.hub is only used when no local artifact is found.
+MODELS_DIR = BASE_DIR / "models"
+YOLOV5_REPO_DIR = None
+ALLOW_HUB_DOWNLOAD = True
+
+# Optimized CPU inference (opt-in): INT8 dynamic quantization of ONNX exports,
+# channels-last layout and torch.inference_mode. Check with compare_inference.py that lane
+# decisions are unchanged before turning it on. Thread counts of None keep
+# torch's defaults.
+OPTIMIZED_INFERENCE = False
+INFERENCE_THREADS = None
+INFERENCE_INTEROP_THREADS = None
+
+# Two-stage cascade (opt-in): score lanes with this small model first and
+# rerun a frame on the full model only when it has more than
+# CASCADE_MAX_UNCERTAIN detections within CASCADE_UNCERTAIN_BAND of the
+# confidence threshold, or when its lane's weight is within
+# CASCADE_WEIGHT_MARGIN (fraction of the busiest lane's weight) of the
+# busiest lane. None always runs the full model.
+CASCADE_MODEL = None
+CASCADE_UNCERTAIN_BAND = 0.1
+CASCADE_MAX_UNCERTAIN = 2
+CASCADE_WEIGHT_MARGIN = 0.15
+
+# Intersections hosted by app.py. All share one model; each has its own
+# lane count and directories (default: intersections/<id>/input_imgs etc.),
+# and optionally "streams" and "rois" in the LANE_STREAMS / LANE_ROIS format.
+# The default intersection keeps using the top-level folders and the
+# un-prefixed routes (/start, /status, ...); others are served under
+# /intersections/<id>/...
+DEFAULT_INTERSECTION = "default"
+INTERSECTIONS = {
+    DEFAULT_INTERSECTION: {"lanes": 4, "input_dir": INPUT_DIR, "inpro_dir": INPRO_DIR, "exit_dir": EXIT_DIR,
+                           "streams": LANE_STREAMS, "rois": LANE_ROIS},
+}
+
+# Requests arriving within this window (seconds) share one forward pass
+INFERENCE_BATCH_WINDOW = 0.01
+INFERENCE_MAX_BATCH = 16
+# Debug uploads allowed to wait for the model before /debug answers 429;
+# lane scoring for the control loop is never turned away
+INFERENCE_MAX_QUEUE = 32
+
+# serve.py: local addresses of the inference and control processes
+SERVE_INFERENCE_ADDRESS = ("127.0.0.1", 5101)
+SERVE_CONTROL_ADDRESS = ("127.0.0.1", 5102)
+SERVE_HTTP_WORKERS = 4
 
 def create_dirs():
     """Create all required directories"""
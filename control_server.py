@@ -0,0 +1,148 @@
+"""
+The control loops in their own process, driven by HTTP worker processes
+
+serve_control() hosts every configured intersection (see IntersectionHost)
+around a RemoteDetector and serves them over a multiprocessing manager.
+RemoteHost is the client used by app.py in HTTP workers: it looks like an
+IntersectionHost, but each call goes to the control process, except debug
+detection, which goes straight to the inference process.
+"""
+import logging
+import os
+import threading
+from multiprocessing.managers import BaseManager
+
+from config import INTERSECTIONS, LOG_LEVEL, create_dirs
+from inference_server import RemoteDetector, connect
+from intersections import IntersectionHost
+from main import TrafficSystem
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ControlManager(BaseManager):
+    pass
+
+
+ControlManager.register("control")
+
+
+class ControlService:
+    """Server side: the subset of TrafficSystem that app.py uses, by intersection id"""
+
+    def __init__(self, host):
+        self.host = host
+
+    def intersections(self):
+        return [(iid, system.lane_count) for iid, system in self.host]
+
+    def is_running(self, iid):
+        return self.host.get(iid).is_running
+
+    def start(self, iid):
+        # start_system runs the control loop until stopped
+        threading.Thread(target=self.host.get(iid).start_system, daemon=True, name=f"control-{iid}").start()
+
+    def stop(self, iid):
+        return self.host.get(iid).stop_system()
+
+    def reset(self, iid):
+        return self.host.get(iid).reset_input_folder()
+
+    def snapshot(self, iid):
+        return self.host.get(iid).snapshot
+
+    def wait_for_state_change(self, iid, seen_version, timeout=None):
+        return self.host.get(iid).wait_for_state_change(seen_version, timeout)
+
+    def has_history(self):
+        return self.host.history is not None
+
+    def query_history(self, kind, intersection, start, end, step=None, lane=None, limit=10000):
+        query = self.host.history.query_counts if kind == "counts" else self.host.history.query_phases
+        return query(intersection, start, end, step, lane, limit)
+
+    def metrics(self):
+        """This process's metrics and the inference process's"""
+        return metrics.merge(metrics.render(skip_empty=True, process="control"), self.host.detector.remote_metrics())
+
+
+def serve_control(address, authkey, inference_address):
+    """Entry point of the control process; blocks forever"""
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    create_dirs()
+    service = ControlService(IntersectionHost(INTERSECTIONS, detector=RemoteDetector(inference_address, authkey)))
+    ControlManager.register("control", callable=lambda: service)
+    server = ControlManager(address=address, authkey=authkey).get_server()
+    logger.info(f"Control process serving {len(service.intersections())} intersections on {address}")
+    server.serve_forever()
+
+
+class RemoteHistory:
+    def __init__(self, service):
+        self._service = service
+
+    def query_counts(self, intersection, start, end, step=None, lane=None, limit=10000):
+        return self._service.query_history("counts", intersection, start, end, step, lane, limit)
+
+    def query_phases(self, intersection, start, end, step=None, lane=None, limit=10000):
+        return self._service.query_history("phases", intersection, start, end, step, lane, limit)
+
+
+class RemoteSystem:
+    """A TrafficSystem in the control process, as seen from an HTTP worker"""
+
+    # Annotates locally; only the forward pass runs in the inference process
+    debug_detection = TrafficSystem.debug_detection
+
+    def __init__(self, service, name, lane_count, detector, history):
+        self._service = service
+        self.name = name
+        self.lane_count = lane_count
+        self.detector = detector
+        self.history = history
+
+    @property
+    def is_running(self):
+        return self._service.is_running(self.name)
+
+    @property
+    def snapshot(self):
+        return self._service.snapshot(self.name)
+
+    def wait_for_state_change(self, seen_version, timeout=None):
+        return self._service.wait_for_state_change(self.name, seen_version, timeout)
+
+    def start_system(self):
+        self._service.start(self.name)
+
+    def stop_system(self):
+        return self._service.stop(self.name)
+
+    def reset_input_folder(self):
+        return self._service.reset(self.name)
+
+
+class RemoteHost:
+    """IntersectionHost stand-in for HTTP workers"""
+
+    def __init__(self, control_address, inference_address, authkey):
+        service = connect(ControlManager, control_address, authkey).control()
+        self.detector = RemoteDetector(inference_address, authkey)
+        history = RemoteHistory(service) if service.has_history() else None
+        self._service = service
+        self.systems = {
+            iid: RemoteSystem(service, iid, lane_count, self.detector, history)
+            for iid, lane_count in service.intersections()
+        }
+
+    def render_metrics(self):
+        """This worker's metrics (e.g. HTTP latency) with the control and inference processes'"""
+        return metrics.merge(metrics.render(skip_empty=True, process=f"http-{os.getpid()}"), self._service.metrics())
+
+    def get(self, iid):
+        return self.systems.get(iid)
+
+    def __iter__(self):
+        return iter(self.systems.items())
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class DebugImageStore:
+    """
+    Debug images on disk, indexed in memory and pruned in the background
+
+    Every file written through the store is recorded with its creation
+    time, so the count limit is enforced as soon as a file is added without
+    listing the directory. A background thread sweeps every
+    ``sweep_interval`` seconds: it re-indexes the folder, so files from a
+    previous run or from other processes sharing the folder (the HTTP
+    workers of serve.py) are counted too, then deletes files older than
+    ``retention`` seconds and the oldest beyond ``max_images``.
+    """
+
+    PATTERNS = ("debug_*.*", "processed_*.*")
+
+    def __init__(self, folder, retention, max_images, sweep_interval=60.0):
+        self.folder = Path(folder)
+        self.retention = retention
+        self.max_images = max_images
+        self.sweep_interval = sweep_interval
+        self._index = OrderedDict()  # filename -> created (epoch seconds), oldest first
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.sweep()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="debug-image-janitor")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def path_for(self, filename):
+        return self.folder / filename
+
+    def add(self, filename):
+        """Record a file just written to the folder and drop the oldest beyond max_images"""
+        with self._lock:
+            self._index[filename] = time.time()
+            self._index.move_to_end(filename)
+            excess = [self._index.popitem(last=False)[0] for _ in range(len(self._index) - self.max_images)]
+        self._remove(excess, "excess")
+
+    def __contains__(self, filename):
+        with self._lock:
+            return filename in self._index
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    def sweep(self):
+        """Re-index the folder, then delete files older than the retention period and beyond max_images"""
+        self._rescan()
+        cutoff = time.time() - self.retention
+        expired = []
+        with self._lock:
+            while self._index:
+                name, created = next(iter(self._index.items()))
+                if created > cutoff:
+                    break
+                self._index.popitem(last=False)
+                expired.append(name)
+            excess = [self._index.popitem(last=False)[0] for _ in range(len(self._index) - self.max_images)]
+        self._remove(expired, "old")
+        self._remove(excess, "excess")
+
+    def _rescan(self):
+        existing = []
+        for pattern in self.PATTERNS:
+            for path in self.folder.glob(pattern):
+                try:
+                    existing.append((path.stat().st_mtime, path.name))
+                except OSError:
+                    continue
+        with self._lock:
+            self._index = OrderedDict((name, created) for created, name in sorted(existing))
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error during debug image cleanup: {e}")
+
+    def _remove(self, names, reason):
+        for name in names:
+            try:
+                os.remove(self.folder / name)
+                logger.info(f"Cleaned up {reason} debug image: {name}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Failed to delete {name}: {e}")
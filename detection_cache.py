@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from metrics import CACHE_LOOKUPS
+
+
+class DetectionCache:
+    """LRU cache of detection results keyed by image content hash.
+
+    Lookups first check the file's (mtime, size) against the last time the
+    same path was hashed, so an unchanged lane image is never re-read. When
+    ``db_path`` is set, entries are also written through to a local SQLite
+    store so identical images still hit after a restart or a folder reset;
+    the store keeps the ``max_entries`` most recently written entries.
+    """
+
+    def __init__(self, max_entries=256, db_path=None, namespace=""):
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()     # key -> (details, weight)
+        self._stat_index = OrderedDict()  # path -> (mtime_ns, size, digest)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path is not None:
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS detections ("
+                "key TEXT PRIMARY KEY, details TEXT NOT NULL, weight REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def key_for(self, image_path):
+        """Return the cache key for an image file, or None if it is missing"""
+        path = str(image_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            known = self._stat_index.get(path)
+            if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+                self._stat_index.move_to_end(path)
+                return known[2]
+
+        digest = self._hash_file(path)
+        if digest is None:
+            return None
+        key = f"{self.namespace}:{digest}"
+
+        with self._lock:
+            self._stat_index[path] = (st.st_mtime_ns, st.st_size, key)
+            self._stat_index.move_to_end(path)
+            while len(self._stat_index) > self.max_entries:
+                self._stat_index.popitem(last=False)
+        return key
+
+    def key_for_bytes(self, data):
+        """Return the cache key for an image already read into memory"""
+        return f"{self.namespace}:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+
+    def get(self, key):
+        """Return cached (details, weight) for a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result="hit")
+                return dict(entry[0]), entry[1]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT details, weight FROM detections WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, entry)
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(result="hit")
+                    return dict(entry[0]), entry[1]
+
+            self.misses += 1
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+    def put(self, key, details, weight):
+        """Store a detection result under a key"""
+        entry = (dict(details), weight)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO detections (key, details, weight) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry[0]), float(weight)),
+                )
+                # REPLACE gives rewritten keys a new rowid, so the lowest
+                # rowids are the least recently stored entries
+                self._db.execute(
+                    "DELETE FROM detections WHERE rowid NOT IN "
+                    "(SELECT rowid FROM detections ORDER BY rowid DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop all in-memory entries (the on-disk store is kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._stat_index.clear()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _hash_file(path, chunk_size=1 << 20):
+        h = hashlib.blake2b(digest_size=16)
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    h.update(chunk)
+        except OSError:
+            return None
+        return h.hexdigest()
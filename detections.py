@@ -0,0 +1,87 @@
+import hashlib
+
+import torch
+
+
+class Detections:
+    """
+    Detections of one image as contiguous tensors
+
+    ``boxes`` is (n, 4) x1, y1, x2, y2 in original image coordinates,
+    ``scores`` (n,) confidences and ``classes`` (n,) int64 class ids.
+    Indexing with a mask or index tensor selects detections.
+    """
+
+    __slots__ = ("boxes", "scores", "classes")
+
+    def __init__(self, boxes, scores, classes):
+        self.boxes = boxes
+        self.scores = scores
+        self.classes = classes
+
+    @classmethod
+    def from_xyxy(cls, det):
+        """From the model's (x1, y1, x2, y2, conf, cls) rows"""
+        det = det.detach().cpu()
+        return cls(det[:, :4].contiguous(), det[:, 4].contiguous(), det[:, 5].long())
+
+    @classmethod
+    def from_numpy(cls, boxes, scores, classes):
+        return cls(torch.from_numpy(boxes), torch.from_numpy(scores), torch.from_numpy(classes))
+
+    def numpy(self):
+        """(boxes, scores, classes) arrays, e.g. to send to another process"""
+        return self.boxes.numpy(), self.scores.numpy(), self.classes.numpy()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, index):
+        return Detections(self.boxes[index], self.scores[index], self.classes[index])
+
+
+class ClassWeights:
+    """
+    Dense class id -> weight table
+
+    Classes missing from ``classes`` ({id: (name, weight)}) weigh 0 and are
+    not counted, so filtering, counting and weighting are a few tensor ops
+    however many boxes a frame has.
+    """
+
+    def __init__(self, classes):
+        self.names = {cls: name for cls, (name, _) in classes.items()}
+        size = max(classes, default=-1) + 1
+        self.weights = torch.zeros(size, dtype=torch.float64)
+        self.counted = torch.zeros(size, dtype=torch.bool)
+        for cls, (_, weight) in classes.items():
+            self.weights[cls] = weight
+            self.counted[cls] = True
+        table = ",".join(f"{cls}={name}:{weight!r}" for cls, (name, weight) in sorted(classes.items()))
+        # Changes whenever the table does, e.g. for cache keys of weighted results
+        self.key = hashlib.blake2b(table.encode(), digest_size=4).hexdigest()
+
+    def counts(self, det, conf_threshold=0.0):
+        """Detections per class id at or above conf_threshold, shape (num classes,)"""
+        size = len(self.weights)
+        classes = det.classes
+        keep = (det.scores >= conf_threshold) & (classes >= 0) & (classes < size)
+        classes = classes[keep]
+        return torch.bincount(classes[self.counted[classes]], minlength=size)
+
+    def summarize(self, det, conf_threshold=0.20):
+        """({class name: count} for counted classes present, total weight)"""
+        counts = self.counts(det, conf_threshold)
+        present = counts.nonzero().flatten().tolist()
+        details = {self.names[cls]: n for cls, n in zip(present, counts[present].tolist())}
+        return details, float(counts.double() @ self.weights)
+
+    def uncertain(self, det, conf_threshold, band):
+        """Number of counted detections scored within band of conf_threshold"""
+        classes = det.classes.clamp(0, max(len(self.counted) - 1, 0))
+        near = (det.scores - conf_threshold).abs() < band
+        return int((near & (det.classes == classes) & self.counted[classes]).sum())
+
+    def total(self, det, conf_threshold=0.0):
+        """Number of counted detections at or above conf_threshold"""
+        return int(self.counts(det, conf_threshold).sum())
@@ -0,0 +1,137 @@
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from metrics import IMAGES_DECODED
+from preprocess import letterbox_into
+
+logger = logging.getLogger(__name__)
+
+
+def decode_image(data):
+    """Decode encoded image bytes (JPEG, PNG, ...) into a BGR array, or None"""
+    if not data:
+        return None
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        IMAGES_DECODED.inc()
+    return image
+
+
+def encode_jpeg(image, quality=90):
+    """Encode a BGR array as JPEG bytes in memory"""
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode image as JPEG")
+    return buf.tobytes()
+
+
+def load_for_inference(path, size):
+    """
+    Decode and letterbox an image file to the model's input size
+
+    Used by worker processes (see analyze.py), so that only the model-size
+    image is sent back; this module must not import torch.
+
+    Returns:
+        tuple: (path, size x size x 3 BGR array, or None if unreadable)
+    """
+    img = cv2.imread(path)
+    if img is None:
+        return path, None
+    padded, _, _ = letterbox_into(img, np.empty((size, size, 3), dtype=np.uint8))
+    return path, padded
+
+
+class Frame:
+    """A decoded image together with the cache key of its encoded bytes"""
+
+    __slots__ = ("path", "key", "image")
+
+    def __init__(self, path, key, image):
+        self.path = path
+        self.key = key
+        self.image = image
+
+
+class FrameStore:
+    """
+    Decoded frames for each lane, so an image is read and decoded once
+
+    Each file is read once. The detection-cache key is computed from those
+    bytes and the same buffer is decoded, so the key and the pixels always
+    match. Images that have been scored but not yet given to a lane (e.g.
+    the next intake image prefetched during a green phase) stay "staged"
+    until a lane takes them.
+    """
+
+    def __init__(self, key_fn, max_staged=8):
+        self.key_fn = key_fn
+        self.max_staged = max_staged
+        self.decodes = 0
+        self._lanes = {}
+        self._staged = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """Return the frame for an unassigned image, decoding and staging it once"""
+        path = Path(path)
+        with self._lock:
+            frame = self._staged.get(path)
+            if frame is not None:
+                return frame
+
+        frame = self._read(path)
+        if frame is None:
+            return None
+        with self._lock:
+            self._staged[path] = frame
+            while len(self._staged) > self.max_staged:
+                self._staged.popitem(last=False)
+        return frame
+
+    def take(self, path):
+        """Remove and return a staged frame, decoding it if it was never staged"""
+        path = Path(path)
+        with self._lock:
+            frame = self._staged.pop(path, None)
+        return frame if frame is not None else self._read(path)
+
+    def set_lane(self, lane, frame):
+        with self._lock:
+            if frame is None:
+                self._lanes.pop(lane, None)
+            else:
+                self._lanes[lane] = frame
+
+    def lane(self, lane):
+        with self._lock:
+            return self._lanes.get(lane)
+
+    def drop_lane(self, lane):
+        with self._lock:
+            self._lanes.pop(lane, None)
+
+    def clear(self):
+        with self._lock:
+            self._lanes.clear()
+            self._staged.clear()
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            logger.warning(f"Failed to read image: {path}")
+            return None
+
+        image = decode_image(data)
+        if image is None:
+            logger.warning(f"Failed to decode image: {path}")
+            return None
+        self.decodes += 1
+        return Frame(path, self.key_fn(data), image)
@@ -0,0 +1,182 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS lane_counts ("
+    "ts REAL NOT NULL, intersection TEXT NOT NULL, lane INTEGER NOT NULL, "
+    "weight REAL NOT NULL, details TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS lane_counts_by_time ON lane_counts (intersection, ts)",
+    "CREATE TABLE IF NOT EXISTS phases ("
+    "ts REAL NOT NULL, intersection TEXT NOT NULL, phase TEXT NOT NULL, "
+    "lane INTEGER, duration REAL)",
+    "CREATE INDEX IF NOT EXISTS phases_by_time ON phases (intersection, ts)",
+)
+
+
+class HistoryStore:
+    """
+    Append-only history of lane counts and phase changes
+
+    Records go into an in-memory ring buffer, so recording on the control
+    loop is just an append. A background thread writes the buffer to
+    SQLite in one transaction every ``flush_interval`` seconds. If the
+    buffer fills between flushes the oldest records are dropped and
+    counted in ``dropped``; records a failed write could not store are
+    kept for the next flush under the same limit. Both tables are indexed on (intersection, ts),
+    so range queries and downsampling only read the requested window.
+    """
+
+    def __init__(self, db_path, flush_interval=5.0, buffer_size=10000):
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._buffer_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="history-flush")
+        self._thread.start()
+
+    def record_counts(self, intersection, lane_results, ts=None):
+        """Record (details, weight) for lanes 1..n"""
+        ts = time.time() if ts is None else ts
+        rows = [
+            ("lane_counts", (ts, intersection, lane, float(weight), json.dumps(details)))
+            for lane, (details, weight) in enumerate(lane_results, 1)
+        ]
+        self._append(rows)
+
+    def record_phase(self, intersection, phase, lane=None, duration=None, ts=None):
+        ts = time.time() if ts is None else ts
+        self._append([("phases", (ts, intersection, phase, lane, duration))])
+
+    def _append(self, rows):
+        with self._buffer_lock:
+            overflow = len(self._buffer) + len(rows) - self._buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._buffer.extend(rows)
+
+    def flush(self):
+        with self._buffer_lock:
+            rows, self._buffer = list(self._buffer), deque(maxlen=self._buffer.maxlen)
+        if not rows:
+            return 0
+
+        counts = [values for table, values in rows if table == "lane_counts"]
+        phases = [values for table, values in rows if table == "phases"]
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany("INSERT INTO lane_counts VALUES (?, ?, ?, ?, ?)", counts)
+                    self._db.executemany("INSERT INTO phases VALUES (?, ?, ?, ?, ?)", phases)
+        except sqlite3.Error:
+            # The transaction was rolled back; retry these rows on the next flush
+            self._requeue(rows)
+            raise
+        return len(rows)
+
+    def _requeue(self, rows):
+        """Put unwritten rows back ahead of those recorded since, dropping the oldest beyond the buffer size"""
+        with self._buffer_lock:
+            pending = rows + list(self._buffer)
+            overflow = len(pending) - self._buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._buffer = deque(pending, maxlen=self._buffer.maxlen)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to flush history: {e}")
+
+    def query_counts(self, intersection, start, end, step=None, lane=None, limit=10000):
+        """
+        Lane counts recorded in [start, end)
+
+        Args:
+            step (float): Bucket size in seconds; None returns raw records
+                with per-class details, otherwise the mean and max weight
+                per lane and bucket
+            lane (int): Only this lane
+
+        Returns:
+            list: One dict per record or bucket, oldest first
+        """
+        self.flush()
+        where = "intersection = ? AND ts >= ? AND ts < ?"
+        params = [intersection, start, end]
+        if lane is not None:
+            where += " AND lane = ?"
+            params.append(lane)
+
+        if step is None:
+            sql = f"SELECT ts, lane, weight, details FROM lane_counts WHERE {where} ORDER BY ts LIMIT ?"
+            rows = self._query(sql, params + [limit])
+            return [
+                {"ts": ts, "lane": lane, "weight": weight, "details": json.loads(details)}
+                for ts, lane, weight, details in rows
+            ]
+
+        sql = (
+            f"SELECT CAST((ts - ?) / ? AS INTEGER) AS bucket, lane, AVG(weight), MAX(weight), COUNT(*) "
+            f"FROM lane_counts WHERE {where} GROUP BY bucket, lane ORDER BY bucket, lane LIMIT ?"
+        )
+        rows = self._query(sql, [start, step] + params + [limit])
+        return [
+            {"ts": start + bucket * step, "lane": lane, "mean_weight": round(mean, 3), "max_weight": peak, "samples": n}
+            for bucket, lane, mean, peak, n in rows
+        ]
+
+    def query_phases(self, intersection, start, end, step=None, lane=None, limit=10000):
+        """
+        Phase changes recorded in [start, end)
+
+        With ``step``, returns per bucket and lane how many green phases
+        started and how many green seconds were granted.
+        """
+        self.flush()
+        where = "intersection = ? AND ts >= ? AND ts < ?"
+        params = [intersection, start, end]
+        if lane is not None:
+            where += " AND lane = ?"
+            params.append(lane)
+
+        if step is None:
+            sql = f"SELECT ts, phase, lane, duration FROM phases WHERE {where} ORDER BY ts LIMIT ?"
+            rows = self._query(sql, params + [limit])
+            return [{"ts": ts, "phase": phase, "lane": lane, "duration": duration} for ts, phase, lane, duration in rows]
+
+        sql = (
+            f"SELECT CAST((ts - ?) / ? AS INTEGER) AS bucket, lane, COUNT(*), SUM(duration) "
+            f"FROM phases WHERE {where} AND phase = 'green' GROUP BY bucket, lane ORDER BY bucket, lane LIMIT ?"
+        )
+        rows = self._query(sql, [start, step] + params + [limit])
+        return [
+            {"ts": start + bucket * step, "lane": lane, "green_phases": n, "green_seconds": total or 0}
+            for bucket, lane, n, total in rows
+        ]
+
+    def _query(self, sql, params):
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
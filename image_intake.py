@@ -0,0 +1,193 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """Return libc if it exposes inotify, otherwise None"""
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ImageIntake:
+    """
+    In-memory FIFO of ready images in an input directory
+
+    On Linux the directory is watched with inotify: a file is queued once it
+    is fully written (IN_CLOSE_WRITE) or renamed into place (IN_MOVED_TO).
+    Elsewhere, or if inotify cannot be set up, the directory is rescanned
+    every ``poll_interval`` seconds on a background thread. Either way,
+    callers never scan the directory themselves.
+
+    Images handed out by pop() are not queued again by a rescan while they
+    are still in the directory (as they are without an audit trail); only
+    add() or a fresh write of the file queues them again.
+    """
+
+    def __init__(self, input_dir, exts, poll_interval=1.0):
+        self.input_dir = Path(input_dir)
+        self.exts = tuple(e.lower() for e in exts)
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._queue = OrderedDict()
+        self._handed_out = set()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.input_dir.mkdir(parents=True, exist_ok=True)
+
+        # Watch before scanning so a file written in between is not missed;
+        # one seen both ways is queued once
+        libc = _load_inotify()
+        fd = self._open_inotify(libc) if libc else None
+
+        # Existing backlog is queued in name order, then arrivals in event order
+        with self._cond:
+            for path in self._scan():
+                self._queue[path] = None
+            self._cond.notify_all()
+
+        if fd is not None:
+            self.mode = "inotify"
+            target = self._watch_inotify
+            args = (fd,)
+        else:
+            self.mode = "polling"
+            target = self._watch_polling
+            args = ()
+        self._thread = threading.Thread(target=target, args=args, daemon=True, name="image-intake")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._queue)
+
+    def peek(self):
+        """Oldest ready image without removing it, or None"""
+        with self._cond:
+            while self._queue:
+                path = next(iter(self._queue))
+                if path.exists():
+                    return path
+                del self._queue[path]
+        return None
+
+    def pop(self):
+        """Remove and return the oldest ready image, or None"""
+        with self._cond:
+            while self._queue:
+                path, _ = self._queue.popitem(last=False)
+                if path.exists():
+                    self._handed_out.add(path)
+                    return path
+        return None
+
+    def add(self, path):
+        """Queue a file placed in the input directory by this process"""
+        path = Path(path)
+        if path.suffix.lower() not in self.exts:
+            return
+        with self._cond:
+            self._handed_out.discard(path)
+            self._queue[path] = None
+            self._cond.notify_all()
+
+    def discard(self, path):
+        with self._cond:
+            self._queue.pop(Path(path), None)
+            self._handed_out.discard(Path(path))
+
+    def wait_for(self, count, timeout=None):
+        """Block until at least ``count`` images are queued; returns success"""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._queue) >= count or self._stop.is_set(), timeout) \
+                and len(self._queue) >= count
+
+    def _scan(self):
+        return sorted(f for f in self.input_dir.iterdir() if f.is_file() and f.suffix.lower() in self.exts)
+
+    def _open_inotify(self, libc):
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+        if libc.inotify_add_watch(fd, str(self.input_dir).encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _watch_inotify(self, fd):
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], self.poll_interval)
+                if not readable:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._handle_events(data)
+        finally:
+            os.close(fd)
+
+    def _handle_events(self, data):
+        offset = 0
+        while offset < len(data):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                self._resync()
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.add(self.input_dir / name)
+            elif mask & (IN_MOVED_FROM | IN_DELETE):
+                self.discard(self.input_dir / name)
+
+    def _watch_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            self._resync()
+
+    def _resync(self):
+        """Reconcile the queue with the directory, keeping known order"""
+        current = self._scan()
+        with self._cond:
+            present = set(current)
+            for path in [p for p in self._queue if p not in present]:
+                del self._queue[path]
+            self._handed_out &= present
+            for path in current:
+                if path not in self._queue and path not in self._handed_out:
+                    self._queue[path] = None
+            self._cond.notify_all()
@@ -0,0 +1,216 @@
+"""
+The model in its own process, shared with other local processes
+
+serve_inference() loads one VehicleDetector behind an InferenceBatcher and
+serves it over a multiprocessing manager. RemoteDetector is the client: a
+VehicleDetector whose infer() copies the decoded frames into a shared
+memory segment and sends only their offsets and shapes, so no process
+other than the inference process holds the model or pickles frames.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing.managers import BaseManager
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from config import INFERENCE_MAX_BATCH, INFERENCE_BATCH_WINDOW, INFERENCE_MAX_QUEUE, LOG_LEVEL
+from detections import Detections
+from inference_service import InferenceBatcher, PRIORITY_CONTROL
+import metrics
+from vehicle_detector import VehicleDetector
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceManager(BaseManager):
+    pass
+
+
+InferenceManager.register("inference")
+
+
+def connect(manager_cls, address, authkey, timeout=60.0):
+    """Connect to a manager server, waiting for it to come up"""
+    deadline = time.monotonic() + timeout
+    while True:
+        manager = manager_cls(address=address, authkey=authkey)
+        try:
+            manager.connect()
+            return manager
+        except (ConnectionRefusedError, FileNotFoundError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+class InferenceService:
+    """
+    Server side: runs frames found in clients' shared memory segments
+
+    Segments are attached by name the first time they are seen and kept
+    open (clients reuse one segment per thread), up to ``max_segments``.
+    """
+
+    def __init__(self, detector, max_batch=16, window=0.01, max_queue=32, max_segments=64):
+        self.detector = detector
+        self.batcher = InferenceBatcher(detector, max_batch=max_batch, window=window, max_queue=max_queue)
+        self.max_segments = max_segments
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def info(self):
+        return {
+            "model_name": self.detector.model_name,
+            "model_variant": self.detector.model_variant,
+            "optimized": self.detector.optimized,
+            "cascade": self.detector.cascade,
+        }
+
+    def wait_until_ready(self, timeout=None):
+        ready = self.detector.wait_until_ready(timeout)
+        return {
+            "ready": ready,
+            "load_error": self.detector.load_error,
+            "input_size": self.detector.input_size if ready else None,
+        }
+
+    def infer_shared(self, name, layout, priority=PRIORITY_CONTROL, escalate=False):
+        """
+        Args:
+            name (str): Shared memory segment holding the frames
+            layout (list): (offset, shape) of each uint8 frame in the segment
+            priority (int): Queue priority, see inference_service
+            escalate (bool): Skip the cascade's first stage
+
+        Returns:
+            list: (boxes, scores, classes) arrays per frame, see Detections
+        """
+        buf = self._segment(name).buf
+        frames = [np.ndarray(shape, dtype=np.uint8, buffer=buf, offset=offset) for offset, shape in layout]
+        return [det.numpy() for det in self.batcher.infer(frames, priority, escalate)]
+
+    def metrics(self):
+        return metrics.render(skip_empty=True, process="inference")
+
+    def _segment(self, name):
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is not None:
+                self._segments.move_to_end(name)
+                return segment
+
+            segment = self._segments[name] = SharedMemory(name=name)
+            # The client owns the segment; don't let this process unlink it on exit
+            resource_tracker.unregister(segment._name, "shared_memory")
+            while len(self._segments) > self.max_segments:
+                _, old = self._segments.popitem(last=False)
+                try:
+                    old.close()
+                except BufferError:
+                    pass  # Still in use by a running batch; unmapped when collected
+            return segment
+
+
+def serve_inference(address, authkey):
+    """Entry point of the inference process; blocks forever"""
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    service = InferenceService(
+        VehicleDetector(),
+        max_batch=INFERENCE_MAX_BATCH,
+        window=INFERENCE_BATCH_WINDOW,
+        max_queue=INFERENCE_MAX_QUEUE
+    )
+    InferenceManager.register("inference", callable=lambda: service)
+    server = InferenceManager(address=address, authkey=authkey).get_server()
+    logger.info(f"Inference process serving {service.detector.model_variant} on {address}")
+    server.serve_forever()
+
+
+class RemoteDetector(VehicleDetector):
+    """
+    VehicleDetector backed by the inference process
+
+    Decoding, load_frames and summarize run locally; infer() ships frames
+    through a shared memory segment per calling thread that grows as
+    needed. Accepts a priority like InferenceBatcher.
+    """
+
+    prioritized = True
+
+    def __init__(self, address, authkey, connect_timeout=60.0):
+        self._service = connect(InferenceManager, address, authkey, connect_timeout).inference()
+        self._input_size = None
+        self._local = threading.local()
+        self._arenas = []
+        self._arenas_lock = threading.Lock()
+        info = self._service.info()
+        super().__init__(model_name=info["model_name"], background=True, optimized=info["optimized"], cascade=None)
+        # Same cache namespace and cascade behaviour as the inference process
+        self.model_variant = info["model_variant"]
+        self.cascade = info["cascade"]
+
+    def _load_model(self):
+        try:
+            state = self._service.wait_until_ready()
+            self.load_error = state["load_error"]
+            if state["ready"]:
+                self._input_size = state["input_size"]
+                self._model = self._service
+        except Exception as e:
+            self.load_error = str(e)
+            logger.error(f"Inference process unavailable: {e}")
+        finally:
+            self._ready.set()
+
+    @property
+    def input_size(self):
+        self._ready.wait()
+        return self._input_size
+
+    def infer(self, frames, priority=PRIORITY_CONTROL, escalate=False):
+        outputs = [None] * len(frames)
+        valid = [i for i, img in enumerate(frames) if img is not None]
+        if not valid:
+            return outputs
+
+        layout, size = [], 0
+        for i in valid:
+            layout.append((size, frames[i].shape))
+            size += frames[i].nbytes
+        arena = self._arena(size)
+        for i, (offset, shape) in zip(valid, layout):
+            np.ndarray(shape, dtype=np.uint8, buffer=arena.buf, offset=offset)[...] = frames[i]
+
+        results = self.model.infer_shared(arena.name, layout, priority, escalate)
+        for i, det in zip(valid, results):
+            outputs[i] = Detections.from_numpy(*det)
+        return outputs
+
+    def _arena(self, size):
+        arena = getattr(self._local, "arena", None)
+        if arena is not None and arena.size >= size:
+            return arena
+
+        new = SharedMemory(create=True, size=max(size, 2 * arena.size if arena else 0))
+        with self._arenas_lock:
+            if arena is not None:
+                self._arenas.remove(arena)
+                arena.close()
+                arena.unlink()
+            self._arenas.append(new)
+        self._local.arena = new
+        return new
+
+    def remote_metrics(self):
+        return self._service.metrics()
+
+    def close(self):
+        with self._arenas_lock:
+            for arena in self._arenas:
+                arena.close()
+                arena.unlink()
+            self._arenas = []
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import INFERENCE_QUEUE_DEPTH, INFERENCE_REJECTED
+
+# Lower runs first: lane scoring for the control loop, then debug uploads
+PRIORITY_CONTROL = 0
+PRIORITY_DEBUG = 1
+PRIORITY_NAMES = {PRIORITY_CONTROL: "control", PRIORITY_DEBUG: "debug"}
+
+
+class QueueFullError(RuntimeError):
+    """Raised instead of queueing a low-priority request when the queue is full"""
+
+
+class _InferenceRequest:
+    __slots__ = ("frames", "escalate", "future")
+
+    def __init__(self, frames, escalate=False):
+        self.frames = frames
+        self.escalate = escalate
+        self.future = Future()
+
+
+class InferenceBatcher:
+    """
+    Shares one VehicleDetector between many callers and coalesces their
+    requests into shared forward passes
+
+    Callers decode their own images, so decoding stays parallel. Only the
+    model call is queued. The worker takes the oldest request of the most
+    urgent priority, waits up to ``window`` seconds for more to arrive, and
+    runs them as one batch of at most ``max_batch`` frames, topped up with
+    lower-priority requests if there is room. Control-loop requests always
+    go first, so a burst of debug uploads delays a lane decision by at most
+    one batch.
+
+    Only lower-priority queues are bounded: once ``max_queue`` requests are
+    waiting, further ones raise QueueFullError (HTTP 429) instead of piling
+    up. Control requests are never rejected. Every other attribute is
+    forwarded to the wrapped detector, so the batcher can stand in for it.
+    """
+
+    # infer() takes a priority
+    prioritized = True
+
+    def __init__(self, detector, max_batch=16, window=0.01, max_queue=32):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.window = window
+        self.max_queue = max_queue
+        self._queues = {priority: deque() for priority in sorted(PRIORITY_NAMES)}
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True, name="inference-batcher")
+        self._worker.start()
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+    def detect_batch(self, images, conf_threshold=0.20):
+        detections = self.infer(self.detector.load_frames(images))
+        return [None if det is None else self.detector.summarize(det, conf_threshold) for det in detections]
+
+    def infer(self, frames, priority=PRIORITY_CONTROL, escalate=False):
+        outputs = [None] * len(frames)
+        valid = [i for i, img in enumerate(frames) if img is not None]
+        if not valid:
+            return outputs
+
+        request = _InferenceRequest([frames[i] for i in valid], escalate)
+        with self._cond:
+            queue = self._queues[priority]
+            if priority != PRIORITY_CONTROL and len(queue) >= self.max_queue:
+                INFERENCE_REJECTED.inc(priority=PRIORITY_NAMES[priority])
+                raise QueueFullError(f"Inference queue is full ({len(queue)} {PRIORITY_NAMES[priority]} requests waiting)")
+            queue.append(request)
+            INFERENCE_QUEUE_DEPTH.set(len(queue), priority=PRIORITY_NAMES[priority])
+            self._cond.notify()
+
+        for i, det in zip(valid, request.future.result()):
+            outputs[i] = det
+        return outputs
+
+    def _pending(self):
+        return any(self._queues.values())
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(self._pending)
+            first = next(queue for queue in self._queues.values() if queue).popleft()
+            batch, size = [first], len(first.frames)
+            deadline = time.monotonic() + self.window
+
+            while size < self.max_batch:
+                # Most urgent queue first; stop at a request that doesn't fit
+                queue = next((q for q in self._queues.values() if q), None)
+                if queue is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                    continue
+                if size + len(queue[0].frames) > self.max_batch:
+                    break
+                request = queue.popleft()
+                batch.append(request)
+                size += len(request.frames)
+
+            for priority, queue in self._queues.items():
+                INFERENCE_QUEUE_DEPTH.set(len(queue), priority=PRIORITY_NAMES[priority])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # Escalated requests skip a cascade's first stage, so they run separately
+            for escalate in (False, True):
+                requests = [request for request in batch if request.escalate == escalate]
+                if requests:
+                    self._run_requests(requests, escalate)
+
+    def _run_requests(self, batch, escalate):
+        frames = [frame for request in batch for frame in request.frames]
+        try:
+            detections = self.detector.infer(frames, escalate=escalate)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            n = len(request.frames)
+            request.future.set_result(detections[offset:offset + n])
+            offset += n
@@ -0,0 +1,77 @@
+import logging
+from pathlib import Path
+
+from config import BASE_DIR, CACHE_MAX_ENTRIES, CACHE_DB_PATH, HISTORY_DB_PATH, HISTORY_FLUSH_INTERVAL, HISTORY_BUFFER_SIZE, DETECTION_CONF_THRESHOLD, INFERENCE_MAX_BATCH, INFERENCE_BATCH_WINDOW, INFERENCE_MAX_QUEUE
+from detection_cache import DetectionCache
+from history import HistoryStore
+from inference_service import InferenceBatcher
+from main import TrafficSystem
+import metrics
+from vehicle_detector import VehicleDetector
+
+logger = logging.getLogger(__name__)
+
+
+class IntersectionHost:
+    """
+    Runs several intersections in one process around a single model
+
+    Each intersection gets its own TrafficSystem with its own lane count,
+    directories and phase state. All of them share one VehicleDetector
+    (behind an InferenceBatcher, so concurrent lane scoring from different
+    intersections is coalesced into shared forward passes, ahead of debug
+    uploads) and one detection cache. A detector that already queues by
+    priority, like a RemoteDetector, is used as is.
+    """
+
+    def __init__(self, specs, detector=None):
+        detector = detector if detector is not None else VehicleDetector()
+        if not getattr(detector, "prioritized", False):
+            detector = InferenceBatcher(
+                detector,
+                max_batch=INFERENCE_MAX_BATCH,
+                window=INFERENCE_BATCH_WINDOW,
+                max_queue=INFERENCE_MAX_QUEUE
+            )
+        self.detector = detector
+        self.detection_cache = DetectionCache(
+            max_entries=CACHE_MAX_ENTRIES * max(len(specs), 1),
+            db_path=CACHE_DB_PATH,
+            namespace=f"{self.detector.model_variant}@{DETECTION_CONF_THRESHOLD}/{self.detector.class_weights.key}"
+        )
+        self.history = None
+        if HISTORY_DB_PATH is not None:
+            self.history = HistoryStore(HISTORY_DB_PATH, HISTORY_FLUSH_INTERVAL, HISTORY_BUFFER_SIZE)
+        self.systems = {}
+        for iid, spec in specs.items():
+            self.systems[iid] = self._build(iid, spec)
+
+    def _build(self, iid, spec):
+        root = BASE_DIR / "intersections" / iid
+        dirs = {
+            key: Path(spec.get(key, root / default))
+            for key, default in (("input_dir", "input_imgs"), ("inpro_dir", "inpro_imgs"), ("exit_dir", "exit_imgs"))
+        }
+        for directory in dirs.values():
+            directory.mkdir(parents=True, exist_ok=True)
+
+        logger.info(f"Hosting intersection {iid} with {spec.get('lanes', 4)} lanes")
+        return TrafficSystem(
+            detector=self.detector,
+            detection_cache=self.detection_cache,
+            name=iid,
+            lane_count=spec.get("lanes", 4),
+            streams=spec.get("streams"),
+            rois=spec.get("rois"),
+            history=self.history,
+            **dirs
+        )
+
+    def render_metrics(self):
+        return metrics.render()
+
+    def get(self, iid):
+        return self.systems.get(iid)
+
+    def __iter__(self):
+        return iter(self.systems.items())
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { createRoot } from 'react-dom/client';
 import ControlPanel from './components/ControlPanel/ControlPanel';
 import LanesContainer from './components/LanesContainer/LanesContainer';
@@ -9,7 +9,7 @@ import './App.css';
 function App() {
   const [systemStatus, setSystemStatus] = useState('stopped');
   const [lanes, setLanes] = useState([]);
-  const [updateInterval, setUpdateInterval] = useState(null);
+  const latestStatus = useRef({});
   const [isLoading, setIsLoading] = useState(true);
   const [connectionError, setConnectionError] = useState(null);
 
@@ -25,6 +25,35 @@ function App() {
     fetchInitialStatus();
   }, []);
 
+  // Subscribe to pushed status changes instead of polling /status.
+  // The server sends a full snapshot on connect, then only changed fields.
+  useEffect(() => {
+    const source = new EventSource('http://localhost:5000/stream');
+
+    const applyStatus = (data) => {
+      setSystemStatus(data.system_status || 'stopped');
+      updateLanesData(data);
+      setConnectionError(null);
+    };
+
+    source.addEventListener('snapshot', (event) => {
+      latestStatus.current = JSON.parse(event.data);
+      applyStatus(latestStatus.current);
+    });
+
+    source.addEventListener('delta', (event) => {
+      latestStatus.current = { ...latestStatus.current, ...JSON.parse(event.data) };
+      applyStatus(latestStatus.current);
+    });
+
+    // EventSource reconnects by itself; just surface the outage
+    source.onerror = () => {
+      setConnectionError('Connection lost. Attempting to reconnect...');
+    };
+
+    return () => source.close();
+  }, []);
+
   // Fetch initial system status
   const fetchInitialStatus = async () => {
     try {
@@ -50,25 +79,6 @@ function App() {
     }
   };
 
-  // Update system status
-  const updateSystemStatus = async () => {
-    try {
-      const response = await fetch('http://localhost:5000/status');
-      if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-      
-      const data = await response.json();
-      console.log("Update status data:", data); // Debug log
-      
-      setSystemStatus(data.system_status || 'stopped');
-      updateLanesData(data);
-      setConnectionError(null);
-    } catch (error) {
-      console.error('Error fetching status:', error);
-      setConnectionError('Connection lost. Attempting to reconnect...');
-      setSystemStatus('error');
-    }
-  };
-
   // Update lanes data with proper error handling
   const updateLanesData = (data) => {
     try {
@@ -114,9 +124,8 @@ function App() {
       const data = await response.json();
       console.log("Start response:", data); // Debug log
       
-      if (data.status === 'started') {
-        setUpdateInterval(setInterval(updateSystemStatus, 1000));
-        updateSystemStatus();
+      if (data.status !== 'started') {
+        throw new Error(data.message || 'Start failed');
       }
     } catch (error) {
       console.error('Error starting system:', error);
@@ -142,10 +151,8 @@ function App() {
       const data = await response.json();
       console.log("Stop response:", data); // Debug log
       
-      if (data.status === 'stopped') {
-        clearInterval(updateInterval);
-        setUpdateInterval(null);
-        updateSystemStatus();
+      if (data.status !== 'stopped') {
+        throw new Error(data.message || 'Stop failed');
       }
     } catch (error) {
       console.error('Error stopping system:', error);
@@ -0,0 +1,268 @@
+"""
+Load test for the HTTP API on localhost
+
+Starts app.py in a child process with the stub detector and a scratch
+copy of the sample images, then drives it from --clients concurrent
+clients with a weighted mix of endpoints for --duration seconds and
+writes per-endpoint latency percentiles, status codes, error rates and
+throughput as JSON:
+
+    python loadtest.py                                        # 20 clients, mostly /status
+    python loadtest.py --clients 50 --mix status=80,debug=15,start=2,stop=2,reset=1
+    python loadtest.py --url http://127.0.0.1:5000 --duration 60   # an already running server
+
+/status clients send the last ETag they saw, like the dashboard. 5xx
+responses and connection failures count as errors; 4xx responses (e.g.
+/start while running) and 429s from /debug are reported per status code.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from benchmark import git_commit, summarize_ms
+from config import BASE_DIR, INPUT_DIR, IMAGE_EXTS
+
+ENDPOINTS = ("status", "debug", "start", "stop", "reset")
+DEFAULT_MIX = "status=90,debug=6,start=1,stop=1,reset=2"
+
+
+def run_server(port, workdir, stub_latency):
+    """Child process: app.py on localhost around a StubDetector and scratch directories"""
+    import config
+    spec = {"lanes": 4}
+    for key in ("input_dir", "inpro_dir", "exit_dir"):
+        spec[key] = workdir / key
+    config.INTERSECTIONS.clear()
+    config.INTERSECTIONS[config.DEFAULT_INTERSECTION] = spec
+    config.CACHE_DB_PATH = workdir / "detection_cache.db"
+    config.HISTORY_DB_PATH = workdir / "history.db"
+    config.DEBUG_IMAGE_DIR = workdir / "debug_images"
+
+    import model_registry
+    model_registry.ALLOW_HUB_DOWNLOAD = False
+    import intersections
+    from stub_detector import StubDetector
+    intersections.VehicleDetector = lambda: StubDetector(latency=stub_latency)
+
+    from werkzeug.serving import make_server
+    from app import app
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/intersections", timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r} in --mix; expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def multipart(path):
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="image"; filename="{path.name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    body = head + path.read_bytes() + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """One closed-loop client: picks an endpoint, waits for the response, repeats"""
+
+    def __init__(self, url, mix, uploads, debug_inline, think, seed):
+        self.url = url
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.uploads = uploads
+        self.debug_inline = debug_inline
+        self.think = think
+        self.rng = random.Random(seed)
+        self.etag = None
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def run(self, stop):
+        while not stop.is_set():
+            name = self.rng.choices(self.names, self.weights)[0]
+            start = time.perf_counter()
+            status = self.request(name)
+            self.latencies[name].append((time.perf_counter() - start) * 1e3)
+            self.statuses[name][status] += 1
+            if self.think:
+                stop.wait(self.think)
+
+    def request(self, name):
+        headers, data, method = {}, None, "POST"
+        url = f"{self.url}/{name}"
+        if name == "status":
+            method = "GET"
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+        elif name == "debug":
+            data, headers["Content-Type"] = self.rng.choice(self.uploads)
+            if self.debug_inline:
+                url += "?inline=1"
+
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                if name == "status":
+                    self.etag = response.headers.get("ETag", self.etag)
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+        except OSError as e:
+            return f"failed: {type(e).__name__}"
+
+
+def report_for(clients, elapsed):
+    endpoints = {}
+    for name in ENDPOINTS:
+        latencies = [ms for client in clients for ms in client.latencies.get(name, ())]
+        if not latencies:
+            continue
+        statuses = Counter()
+        for client in clients:
+            statuses.update(client.statuses.get(name, {}))
+        errors = sum(n for status, n in statuses.items() if not isinstance(status, int) or status >= 500)
+        endpoints[name] = {
+            **summarize_ms(latencies),
+            "requests_per_sec": round(len(latencies) / elapsed, 2),
+            "error_rate": round(errors / len(latencies), 4),
+            "statuses": {str(status): n for status, n in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        }
+    return endpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the HTTP API on localhost with a stub detector")
+    parser.add_argument("--url", help="Test a server that is already running instead of starting one")
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--think", type=float, default=0.0, help="Seconds each client waits between requests")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Simulated inference seconds per image")
+    parser.add_argument("--debug-inline", action="store_true", help="Use /debug?inline=1 (no files written)")
+    parser.add_argument("--images", type=Path, default=INPUT_DIR, help="Sample images for the lanes and /debug uploads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="JSON results path (default: bench_results/load_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    images = sorted(f for f in args.images.iterdir() if f.suffix.lower() in IMAGE_EXTS)
+    if not images:
+        raise SystemExit(f"No sample images in {args.images}")
+    mix = parse_mix(args.mix)
+    uploads = [multipart(img) for img in images]
+
+    server, workdir = None, None
+    url = args.url.rstrip("/") if args.url else None
+    if url is None:
+        workdir = Path(tempfile.mkdtemp(prefix="itms-load-"))
+        (workdir / "input_dir").mkdir()
+        for img in images:
+            shutil.copy(img, workdir / "input_dir" / img.name)
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = multiprocessing.get_context("spawn").Process(
+            target=run_server, args=(port, workdir, args.stub_latency), name="app", daemon=True
+        )
+        server.start()
+
+    try:
+        if not wait_until_up(url, timeout=60):
+            raise SystemExit(f"Server at {url} did not come up")
+
+        clients = [
+            Client(url, mix, uploads, args.debug_inline, args.think, seed=args.seed + i)
+            for i in range(args.clients)
+        ]
+        stop = threading.Event()
+        threads = [threading.Thread(target=client.run, args=(stop,), daemon=True) for client in clients]
+        print(f"Load testing {url} with {args.clients} clients for {args.duration:.0f}s...")
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join(timeout=5)
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    endpoints = report_for(clients, elapsed)
+    total = sum(e["count"] for e in endpoints.values())
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "url": args.url,
+            "clients": args.clients,
+            "duration": round(elapsed, 2),
+            "mix": mix,
+            "think": args.think,
+            "stub_latency": args.stub_latency if args.url is None else None,
+            "debug_inline": args.debug_inline,
+        },
+        "total": {"requests": total, "requests_per_sec": round(total / elapsed, 2)},
+        "endpoints": endpoints,
+    }
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = BASE_DIR / "bench_results" / f"load_{report['meta']['commit'] or 'nogit'}_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'endpoint':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}  statuses")
+    for name, e in endpoints.items():
+        statuses = " ".join(f"{status}:{n}" for status, n in e["statuses"].items())
+        print(f"{name:<10}{e['requests_per_sec']:>10.1f}{e['p50_ms']:>10.2f}{e['p95_ms']:>10.2f}"
+              f"{e['p99_ms']:>10.2f}{e['error_rate']:>9.2%}  {statuses}")
+    print(f"\ntotal: {report['total']['requests_per_sec']} requests/sec")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
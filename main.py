@@ -1,79 +1,377 @@
+import json
+import logging
 import shutil
-import time
+import threading
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import emoji
 import cv2
-import torch
 # import torchvision
 # import albumentations as A  # For image augmentations
-from config import BASE_DIR,INPRO_DIR,INPUT_DIR,EXIT_DIR
+from config import INPRO_DIR,INPUT_DIR,EXIT_DIR,CACHE_MAX_ENTRIES,CACHE_DB_PATH,IMAGE_EXTS,INTAKE_POLL_INTERVAL,KEEP_AUDIT_TRAIL,DETECTION_CONF_THRESHOLD
+from config import MOTION_GATE_THRESHOLD,MOTION_GATE_MAX_SKIPS,CASCADE_WEIGHT_MARGIN
+from config import STREAM_SAMPLE_FPS,STREAM_MAX_FRAME_AGE,STREAM_RECONNECT_DELAY,STREAM_START_TIMEOUT
 from vehicle_detector import VehicleDetector
+from detection_cache import DetectionCache
+from image_intake import ImageIntake
+from stream_intake import StreamIntake
+from roi import LaneROI
+from motion_gate import MotionGate
+from frame_store import FrameStore
+from inference_service import QueueFullError, PRIORITY_DEBUG
+from metrics import IMAGES_DECODED
+from phase_scheduler import PhaseScheduler, WallClock
 
 import warnings
 warnings.filterwarnings("ignore")
 
+logger = logging.getLogger(__name__)
+
+class StateSnapshot(namedtuple("StateSnapshot", "version status body etag")):
+    """
+    Everything /status shows, captured at one state version
+
+    ``status`` is the payload dict (treat it as read-only), ``body`` the
+    same payload serialized as JSON and ``etag`` identifies the version.
+    """
+    __slots__ = ()
+
+
 class TrafficSystem:
-    def __init__(self):
-        print("Initializing Enhanced Traffic System...")
-        self.detector = VehicleDetector()
+    def __init__(self, detector=None, cache_db_path=CACHE_DB_PATH, input_dir=INPUT_DIR,
+                 keep_audit_trail=KEEP_AUDIT_TRAIL, clock=None, name="default", lane_count=4,
+                 inpro_dir=INPRO_DIR, exit_dir=EXIT_DIR, detection_cache=None, streams=None, rois=None,
+                 history=None):
+        logger.info("Initializing Enhanced Traffic System...")
+        self.name = name
+        self.lane_count = lane_count
+        self.detector = detector if detector is not None else VehicleDetector()
         self.green_lane = None
         self.base_green_time = 30
+        self.yellow_lead = 15  # Seconds before the end of green to pick the next lane
         self.yellow_lanes = []
         self.exit_counter = 1
         self.lane_time = 0
         self.is_running = False
-        self._warm_up_model()
+        self.conf_threshold = DETECTION_CONF_THRESHOLD
+        # Intersections hosted together share one cache as well as the detector
+        self.detection_cache = detection_cache or DetectionCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            db_path=cache_db_path,
+            namespace=f"{self.detector.model_variant}@{self.conf_threshold}/{self.detector.class_weights.key}"
+        )
+        # Single background worker that scores lanes ahead of the yellow
+        # phase so the countdown loop never waits on the model
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lane-prefetch")
+
+        # Ready images arrive through the intake queue, and the image held
+        # by each lane is tracked here instead of being rediscovered on disk
+        self.input_dir = input_dir
+        self.inpro_dir = inpro_dir
+        self.exit_dir = exit_dir
+        self.intake = ImageIntake(input_dir, IMAGE_EXTS, INTAKE_POLL_INTERVAL)
+        self.intake.start()
+        self.lane_images = {}
+        if inpro_dir.exists():
+            for img in inpro_dir.glob("lane*"):
+                lane = img.stem[len("lane"):]
+                if lane.isdigit() and img.suffix.lower() in IMAGE_EXTS:
+                    self.lane_images[int(lane)] = img
+
+        # Each lane image is decoded once and handed to the detector from
+        # memory; with keep_audit_trail off, files are never moved on disk
+        self.frames = FrameStore(self.detection_cache.key_for_bytes)
+        self.keep_audit_trail = keep_audit_trail
+        self._consumed_inputs = []
+
+        # Optional HistoryStore that lane counts and phase changes are
+        # appended to (shared by hosted intersections)
+        self.history = history
+
+        # Lanes with a region of interest are scored on its crop only, and
+        # only vehicles inside its polygon count
+        self.rois = {int(lane): LaneROI(polygon) for lane, polygon in (rois or {}).items()}
+
+        # Skips the model for lane frames that have not visibly changed
+        self.motion_gate = None
+        if MOTION_GATE_THRESHOLD:
+            self.motion_gate = MotionGate(MOTION_GATE_THRESHOLD, MOTION_GATE_MAX_SKIPS, name=name)
+
+        # Lanes bound to video sources always score the newest decoded
+        # frame; the image folders are not used for them
+        self.streams = None
+        if streams:
+            self.streams = StreamIntake(
+                streams, STREAM_SAMPLE_FPS, STREAM_MAX_FRAME_AGE, STREAM_RECONNECT_DELAY, name=name
+            )
+
+        # Phases are driven by a PhaseScheduler on this clock; a
+        # VirtualClock replays captured frames without real-time waits
+        self.clock = clock or WallClock()
+        self.scheduler = None
+
+        # Lane weights from the last time every lane was scored
+        self.last_counts = []
+
+        # Bumped on every visible state change, which also publishes a new
+        # immutable StateSnapshot. Readers (/status, /stream) only ever see
+        # whole snapshots, never fields the control thread is updating.
+        self.state_version = 0
+        self._state_changed = threading.Condition(threading.RLock())
+        # Versions restart with the process, so ETags carry an instance id
+        self._etag_prefix = f"{name}-{uuid.uuid4().hex[:8]}"
+        self.snapshot = None
+        self.notify_state_change()
+        threading.Thread(target=self._notify_when_model_ready, daemon=True).start()
+
+    def record_phase(self, phase, lane=None, duration=None):
+        if self.history is not None:
+            self.history.record_phase(self.name, phase, lane, duration)
+
+    def notify_state_change(self):
+        with self._state_changed:
+            self._publish_state()
+
+    @contextmanager
+    def state_update(self):
+        """Apply a group of state changes atomically and publish them as one snapshot"""
+        with self._state_changed:
+            yield
+            self._publish_state()
+
+    def _publish_state(self):
+        # Caller holds self._state_changed
+        self.state_version += 1
+        status = {
+            "lane_status": self.get_lane_status(),
+            "system_status": "running" if self.is_running else "stopped",
+            "model_ready": self.detector.is_ready,
+            "time_remain": self.lane_time,
+            "current_lane": self.green_lane,
+            "yellow_lanes": list(self.yellow_lanes),
+            "vehicle_counts": list(self.last_counts) if self.is_running else []
+        }
+        self.snapshot = StateSnapshot(
+            self.state_version, status, json.dumps(status).encode(),
+            f"{self._etag_prefix}-{self.state_version}"
+        )
+        self._state_changed.notify_all()
+
+    def wait_for_state_change(self, seen_version, timeout=None):
+        """Block until state_version differs from seen_version (or timeout); returns the current version"""
+        with self._state_changed:
+            self._state_changed.wait_for(lambda: self.state_version != seen_version, timeout)
+            return self.state_version
+
+    def _notify_when_model_ready(self):
+        self.detector.wait_until_ready()
+        self.notify_state_change()
+
+    def lanes(self):
+        return range(1, self.lane_count + 1)
+
+    def lane_path(self, lane_num):
+        return self.lane_images.get(lane_num, self.inpro_dir / f"lane{lane_num}.jpg")
 
-    def _warm_up_model(self):
-        dummy_img = torch.zeros((1, 3, 640, 640), dtype=torch.float32)
-        with torch.no_grad():
-            _ = self.detector.model(dummy_img)
-        print("Model warmup complete on CPU")
+    def lane_frame(self, lane_num):
+        if self.streams is not None:
+            return self.streams.latest(lane_num)
+        frame = self.frames.lane(lane_num)
+        if frame is None and lane_num in self.lane_images:
+            frame = self.frames.take(self.lane_images[lane_num])
+            self.frames.set_lane(lane_num, frame)
+        return frame
+
+    def _assign_lane(self, lane_num, img_path):
+        frame = self.frames.take(img_path)
+        if self.keep_audit_trail:
+            lane_img = self.inpro_dir / f"lane{lane_num}{img_path.suffix}"
+            shutil.move(str(img_path), str(lane_img))
+            logger.info(f"Moved {img_path.name} -> {self.inpro_dir.name}/{lane_img.name}")
+        else:
+            lane_img = img_path
+            self._consumed_inputs.append(img_path)
+
+        if frame is not None:
+            frame.path = lane_img
+        with self.state_update():
+            self.lane_images[lane_num] = lane_img
+            self.frames.set_lane(lane_num, frame)
+
+    def _retire_lane(self, lane_num):
+        old_img = self.lane_path(lane_num)
+        self.frames.drop_lane(lane_num)
+        if self.keep_audit_trail and old_img.exists():
+            exit_name = f"l{self.exit_counter}{old_img.suffix}"
+            shutil.move(str(old_img), self.exit_dir / exit_name)
+            logger.info(f"Moved {old_img.name} to {self.exit_dir.name}/{exit_name}")
+            self.exit_counter += 1
 
     def initialize_lanes(self):
-        input_images = sorted(INPUT_DIR.glob("*.jpg"))[:4]
-        if len(input_images) < 4:
-            print(f"Need 4 images, only found {len(input_images)}")
+        if self.streams is not None:
+            self.streams.start()
+            if not self.streams.wait_for_frames(STREAM_START_TIMEOUT):
+                logger.warning(f"Not every lane stream produced a frame within {STREAM_START_TIMEOUT}s")
+            return any(self.streams.has_frame(i) for i in self.lanes())
+
+        if len(self.intake) < self.lane_count:
+            logger.warning(f"Need {self.lane_count} images, only found {len(self.intake)}")
             return False
 
-        for i, img_path in enumerate(input_images, 1):
-            lane_name = f"lane{i}.jpg"
-            shutil.move(str(img_path), str(INPRO_DIR / lane_name))
-            print(f"Moved {img_path.name} -> inpro_imgs/{lane_name}")
+        for i in self.lanes():
+            img_path = self.intake.pop()
+            if img_path is None:
+                logger.warning(f"Input image for lane {i} disappeared")
+                return False
+            self._assign_lane(i, img_path)
         return True
 
     def count_lane_vehicles(self):
-        counts = []
-        for i in range(1, 5):
-            img_path = INPRO_DIR / f"lane{i}.jpg"
-            details, weight = self.get_detailed_counts(img_path)
-            print(f"Lane {i}: {weight:.1f} vehicle equivalents")
-            print(f"Details: {details}")
-            counts.append(weight)
-        return counts
-
-    def get_detailed_counts(self, image_path):
-        img = cv2.imread(str(image_path))
-        if img is None:
+        return [weight for _, weight in self.get_lane_details()]
+
+    def get_lane_details(self):
+        """Return (details, weight) for every lane"""
+        frames, lanes = [self.lane_frame(i) for i in self.lanes()], list(self.lanes())
+        lane_results = self.score_frames(frames, lanes)
+        if self.detector.cascade:
+            lane_results = self.settle_close_lanes(frames, lanes, lane_results)
+
+        for i, (details, weight) in enumerate(lane_results, 1):
+            logger.debug("Lane %d: %.1f vehicle equivalents, details: %s", i, weight, details)
+        if self.history is not None:
+            self.history.record_counts(self.name, lane_results)
+        with self.state_update():
+            self.last_counts = [weight for _, weight in lane_results]
+        return lane_results
+
+    def settle_close_lanes(self, frames, lanes, results):
+        """Rescore with the full model every lane whose weight is close
+        enough to the busiest lane's that the cascade's choice could flip"""
+        weights = [weight for _, weight in results]
+        top = max(weights, default=0)
+        if top <= 0:
+            return results
+        close = [
+            idx for idx, weight in enumerate(weights)
+            if frames[idx] is not None and top - weight <= CASCADE_WEIGHT_MARGIN * max(top, 1.0)
+        ]
+        if len(close) < 2:
+            return results
+
+        rescored = self.score_frames([frames[i] for i in close], [lanes[i] for i in close], escalate=True)
+        results = list(results)
+        for idx, result in zip(close, rescored):
+            results[idx] = result
+        return results
+
+    def score_frames(self, frames, lanes, escalate=False):
+        """Return (details, weight) per frame, running a single batched
+        forward pass over the frames that are not already cached
+
+        Args:
+            frames (list): Frame per entry (None scores as empty)
+            lanes (list): Lane each frame is scored for, which selects its ROI
+            escalate (bool): Score with the full model, skipping a cascade's
+                first stage (cached separately)
+        """
+        results = [({}, 0)] * len(frames)
+        pending = []
+
+        for idx, (frame, lane) in enumerate(zip(frames, lanes)):
+            if frame is None:
+                continue
+            # Stream frames have no key and are always scored
+            key = self._score_key(frame.key, lane)
+            if escalate and key is not None:
+                key = f"{key}#full"
+            cached = self.detection_cache.get(key) if key is not None else None
+            if cached is not None:
+                results[idx] = cached
+                continue
+
+            thumb = None
+            # The gate remembers first-stage results, which escalation replaces
+            if self.motion_gate is not None and not escalate:
+                roi = self.rois.get(lane)
+                reused, thumb = self.motion_gate.check(lane, roi.crop(frame.image) if roi else frame.image, key)
+                if reused is not None:
+                    # Not cached: the result belongs to an earlier frame
+                    results[idx] = reused
+                    continue
+            pending.append((idx, key, frame, lane, thumb))
+
+        if pending:
+            batch = self.detect(
+                [frame.image for _, _, frame, _, _ in pending],
+                [self.rois.get(lane) for _, _, _, lane, _ in pending],
+                escalate
+            )
+            for (idx, key, _, lane, thumb), result in zip(pending, batch):
+                if result is None:
+                    continue
+                if key is not None:
+                    self.detection_cache.put(key, *result)
+                if thumb is not None:
+                    self.motion_gate.update(lane, thumb, result)
+                results[idx] = result
+        return results
+
+    def detect(self, images, rois, escalate=False):
+        """
+        Run one batched forward pass, cropping each image to its ROI first
+
+        Args:
+            images (list): Image paths and/or decoded BGR arrays
+            rois (list): LaneROI or None per image
+            escalate (bool): Skip a cascade's first stage
+
+        Returns:
+            list: (details, weight) per image, or None where an image could not be read
+        """
+        frames = self.detector.load_frames(images)
+        crops = [
+            roi.crop(img) if roi is not None and img is not None else img
+            for img, roi in zip(frames, rois)
+        ]
+
+        results = []
+        for img, roi, det in zip(frames, rois, self.detector.infer(crops, escalate=escalate)):
+            if det is None:
+                results.append(None)
+                continue
+            if roi is not None:
+                det = roi.filter(det, img.shape)
+            results.append(self.detector.summarize(det, self.conf_threshold))
+        return results
+
+    def _score_key(self, content_key, lane):
+        roi = self.rois.get(lane)
+        if content_key is None or roi is None:
+            return content_key
+        return f"{content_key}#roi:{roi.key}"
+
+    def get_detailed_counts(self, image_path, lane=None):
+        # Only run the model when the lane image content has changed
+        cache_key = self._score_key(self.detection_cache.key_for(image_path), lane)
+        if cache_key is None:
             return {}, 0
-            
-        results = self.detector.model(img)
-        details = {self.detector.class_names[cls_id]: 0 for cls_id in self.detector.vehicle_classes.keys()}
-        weight = 0
-    
-        for *_, conf, cls in results.xyxy[0]:
-            cls = int(cls)
-            if cls in self.detector.vehicle_classes and conf >= 0.20:
-                name, w_eqv = self.detector.vehicle_classes[cls]
-                weight += w_eqv
-                details[name] += 1
-            
-        return {k: v for k, v in details.items() if v > 0}, weight
+        cached = self.detection_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        result = self.detect([image_path], [self.rois.get(lane)])[0]
+        if result is None:
+            return {}, 0
+        self.detection_cache.put(cache_key, *result)
+        return result
 
     def display_lanes(self):
-        lanes = ["Lane 1", "Lane 2", "Lane 3", "Lane 4"]
+        lanes = [f"Lane {i}" for i in self.lanes()]
         status = []
         
-        for i in range(4):
+        for i in range(self.lane_count):
             if self.green_lane and i == self.green_lane - 1:
                 status.append(emoji.emojize(":green_circle:"))
             elif i + 1 in self.yellow_lanes:
@@ -84,59 +382,47 @@ class TrafficSystem:
         print("\n" + "\t".join(lanes), end='\n ')
         print("\t".join(status) + '\n', sep=' ')
 
+    def next_input_image(self):
+        """The input image replace_lane_image() will use next, if any"""
+        return self.intake.peek()
+
     def replace_lane_image(self, lane_num):
-        image_exts = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
-        input_images = [f for f in INPUT_DIR.glob("*") if f.suffix.lower() in image_exts]
+        # A streamed lane is scored on its newest frame anyway
+        if self.streams is not None:
+            return True
+
+        new_img = self.intake.pop()
     
-        if not input_images:
-            print("\nNo more images in input directory")
+        if new_img is None:
+            logger.warning("No more images in input directory")
             return False
     
-        old_img = INPRO_DIR / f"lane{lane_num}.jpg"
-        exit_name = f"l{self.exit_counter}{old_img.suffix}"
-        shutil.move(str(old_img), EXIT_DIR / exit_name)
-        print(f"\nMoved lane{lane_num}.jpg to exit_imgs/{exit_name}")
-        self.exit_counter += 1
-    
-        new_img = input_images[0]
-        shutil.move(str(new_img), str(INPRO_DIR / f"lane{lane_num}{new_img.suffix}"))
-        print(f"Replaced with {new_img.name}")
+        self._retire_lane(lane_num)
+        self._assign_lane(lane_num, new_img)
+        logger.info(f"Replaced with {new_img.name}")
         return True
 
-    def control_traffic_lights(self, current_lane, duration):
-        self.lane_time = duration
-        self.green_lane = current_lane
-        print(f"\nOpening Lane {current_lane} for {duration} seconds")
-        self.display_lanes()
-        next_lane, next_time = None, 0
-        
-        while self.lane_time > 0 and self.is_running:
-            print(f"\rTime remaining: {self.lane_time}s", end="")
-            
-            if self.lane_time <= 15 and next_lane is None:
-                if not self.replace_lane_image(current_lane):
-                    time.sleep(1)
-                    self.lane_time -= 1
-                    continue
-                
-                next_lane, next_time = self.lane_calc()
-                self.yellow_lanes = [current_lane, next_lane]
-                self.green_lane = None
-                self.display_lanes()
-                print("\nYELLOW PHASE: Preparing transition...")
-            
-            time.sleep(1)
-            self.lane_time -= 1
+    def prefetch_lane_scores(self, current_lane):
+        """Score the waiting lanes and the image that will replace the green
+        lane, so the cache already holds every input lane_calc() will need"""
+        # Stream frames would be stale by the time lane_calc() runs
+        if self.streams is not None:
+            return
+        lanes = [i for i in self.lanes() if i != current_lane]
+        frames = [self.lane_frame(i) for i in lanes]
+        upcoming = self.next_input_image()
+        if upcoming is not None:
+            # It will replace the green lane's image, so it gets that lane's ROI
+            frames.append(self.frames.load(upcoming))
+            lanes.append(current_lane)
+        self.score_frames(frames, lanes)
 
-        if next_lane and self.is_running:
-            print("\n\nTransition complete")
-            self.green_lane = next_lane
-            self.yellow_lanes = []
-            self.control_traffic_lights(next_lane, next_time)
+    def control_traffic_lights(self, current_lane, duration):
+        self.scheduler = PhaseScheduler(self, self.clock)
+        self.scheduler.run(current_lane, duration)
 
     def lane_calc(self):
-        print("\n" + "="*50)
-        print("Counting vehicles for lane selection...")
+        logger.debug("Counting vehicles for lane selection...")
         
         counts = self.count_lane_vehicles()
         max_weight = max(counts)
@@ -146,63 +432,93 @@ class TrafficSystem:
         return lane, lane_time
 
     def reset_input_folder(self):
-        inpro_images = list(INPRO_DIR.glob("*"))
-        exit_images = list(EXIT_DIR.glob("*"))
+        inpro_images = list(self.inpro_dir.glob("*"))
+        exit_images = list(self.exit_dir.glob("*"))
+        consumed, self._consumed_inputs = self._consumed_inputs, []
 
-        if not (inpro_images or exit_images):
+        if not (inpro_images or exit_images or consumed):
             return False
     
         for img in exit_images:
-            shutil.move(str(img), str(INPUT_DIR / img.name))
-            print(f"Moved {img.name} back to input_imgs")
+            shutil.move(str(img), str(self.input_dir / img.name))
+            self.intake.add(self.input_dir / img.name)
+            logger.info(f"Moved {img.name} back to {self.input_dir.name}")
         
         for img in inpro_images:
-            shutil.move(str(img), str(INPUT_DIR / img.name))
-            print(f"Moved {img.name} back to input_imgs")
+            shutil.move(str(img), str(self.input_dir / img.name))
+            self.intake.add(self.input_dir / img.name)
+            logger.info(f"Moved {img.name} back to {self.input_dir.name}")
+
+        # Without the audit trail, consumed inputs never left input_imgs
+        for img in consumed:
+            self.intake.add(img)
     
+        with self.state_update():
+            self.lane_images = {}
+            self.frames.clear()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
         self.exit_counter = 1
         return True
 
-    def debug_detection(self, input_path, output_path):
+    def debug_detection(self, image, output_path=None):
         """
-        Process an image for vehicle detection and save annotated results
+        Process an image for vehicle detection and annotate the results
     
         Args:
-            input_path (str): Path to the input image
-            output_path (str): Path where to save the processed image
+            image (str or np.ndarray): Path to the input image, or an already decoded BGR image
+            output_path (str): Path where to save the processed image; None keeps it in memory
+
+        Returns:
+            np.ndarray: The annotated BGR image
+
+        Raises:
+            QueueFullError: The shared inference queue has no room for
+                another debug request
         """
-        # Read input image
-        img = cv2.imread(input_path)
-        if img is None:
-            raise ValueError(f"Could not read image from {input_path}")
+        # Read input image unless it was decoded in memory
+        if isinstance(image, str):
+            img = cv2.imread(image)
+            if img is None:
+                raise ValueError(f"Could not read image from {image}")
+            IMAGES_DECODED.inc()
+        else:
+            img = image
     
-        # Convert color space if needed (BGR to RGB)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
+        # Same preprocessing and model input as lane scoring; boxes come back
+        # in original image coordinates. Behind a batcher, debug uploads queue
+        # after lane scoring and are turned away when the queue is full
+        try:
+            if getattr(self.detector, "prioritized", False):
+                detections = self.detector.infer([img], priority=PRIORITY_DEBUG)[0]
+            else:
+                detections = self.detector.infer([img])[0]
+        except QueueFullError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error during image processing: {str(e)}")
+
         try:
-            # Perform object detection
-            with torch.no_grad():
-                results = self.detector.model(img_rgb)
-        
             # Create annotated image
-            annotated_img = img_rgb.copy()
-            for det in results.xyxy[0]:
-                x1, y1, x2, y2, conf, cls = det
-                class_name = self.detector.class_names.get(int(cls), "Unknown")
-                confidence = round(conf.item(), 2)
+            annotated_img = img.copy()
+            # One conversion per array instead of per element
+            rows = zip(detections.boxes.int().tolist(), detections.scores.tolist(), detections.classes.tolist())
+            for (x1, y1, x2, y2), conf, cls in rows:
+                class_name = self.detector.class_names.get(cls, "Unknown")
+                confidence = round(conf, 2)
                 
                 # Draw bounding box and label
-                color = (255, 0, 0)  # Red color for boxes
+                color = (0, 0, 255)  # Red color for boxes (BGR)
                 annotated_img = cv2.rectangle(
                     annotated_img, 
-                    (int(x1), int(y1)), 
-                    (int(x2), int(y2)), 
+                    (x1, y1), 
+                    (x2, y2), 
                     color, 2
                 )
                 annotated_img = cv2.putText(
                     annotated_img, 
                     f"{class_name} {confidence}", 
-                    (int(x1), int(y1)-10),
+                    (x1, y1-10),
                     cv2.FONT_HERSHEY_SIMPLEX, 
                     0.5, 
                     color, 
@@ -210,22 +526,17 @@ class TrafficSystem:
                 )
             
             # Save the processed image
-            success = cv2.imwrite(
-                output_path, 
-                cv2.cvtColor(annotated_img, cv2.COLOR_RGB2BGR)
-            )
-            
-            if not success:
+            if output_path is not None and not cv2.imwrite(output_path, annotated_img):
                 raise ValueError(f"Failed to save processed image to {output_path}")
+            return annotated_img
                 
         except Exception as e:
             raise RuntimeError(f"Error during image processing: {str(e)}")
     
     def get_lane_status(self):
         status = {}
-        for i in range(1, 5):
-            img_path = INPRO_DIR / f"lane{i}.jpg"
-            if not img_path.exists():
+        for i in self.lanes():
+            if not self.lane_has_image(i):
                 status[i] = "off"
                 continue
         
@@ -237,11 +548,18 @@ class TrafficSystem:
                 status[i] = "red"
         return status
 
+    def lane_has_image(self, lane_num):
+        if self.streams is not None:
+            return self.streams.has_frame(lane_num)
+        return lane_num in self.lane_images
+
     def start_system(self):
         if not self.is_running:
             self.is_running = True
+            self.notify_state_change()
             if not self.initialize_lanes():
                 self.is_running = False
+                self.notify_state_change()
                 return False
             
             self.green_lane, green_time = self.lane_calc()
@@ -250,10 +568,14 @@ class TrafficSystem:
         return False
 
     def stop_system(self):
-        self.is_running = False
-        self.green_lane = None
-        self.yellow_lanes = []
-        self.lane_time = 0
+        with self.state_update():
+            self.is_running = False
+            self.green_lane = None
+            self.yellow_lanes = []
+            self.lane_time = 0
+        if self.streams is not None:
+            self.streams.stop()
+        self.record_phase("stopped")
         return self.reset_input_folder()
     
     
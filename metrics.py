@@ -0,0 +1,198 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, key, *extra):
+        pairs = list(zip(self.label_names, key))
+        pairs.extend(extra)
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self, const=()):
+        """Exposition lines; const is (label, value) pairs added to every sample"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._render_samples(const))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self, const):
+        return [f"{self.name}{self._format_labels(k, *const)} {_fmt(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_samples(self, const):
+        return [f"{self.name}{self._format_labels(k, *const)} {_fmt(v)}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self, const):
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self._format_labels(key, *const, ('le', _fmt(bound)))} {n}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, *const, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key, *const)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key, *const)} {count}")
+        return lines
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def render(skip_empty=False, process=None):
+    """All registered metrics in the Prometheus text exposition format
+
+    With skip_empty, metrics this process never recorded are left out. With
+    process, every sample gets a process label, so the output of several
+    processes can be combined with merge().
+    """
+    const = (("process", process),) if process else ()
+    lines = []
+    for metric in _registry:
+        if skip_empty and not metric._values:
+            continue
+        lines.extend(metric.render(const))
+    return "\n".join(lines) + "\n"
+
+
+def merge(*texts):
+    """Combine rendered outputs, with one HELP/TYPE header per metric"""
+    families = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, {"header": [], "samples": []})
+                if len(family["header"]) < 2:
+                    family["header"].append(line)
+            elif line and family is not None:
+                family["samples"].append(line)
+    lines = []
+    for family in families.values():
+        lines.extend(family["header"])
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
+
+
+INFERENCE_SECONDS = Histogram(
+    "itms_inference_seconds", "Model forward pass latency per call", labels=("model",)
+)
+INFERENCE_IMAGES = Counter(
+    "itms_inference_images_total", "Images passed through the model", labels=("model",)
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "itms_inference_batch_size", "Images per model forward pass", labels=("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+CASCADE_FRAMES = Counter(
+    "itms_cascade_frames_total",
+    "Frames scored by the cascade's first stage, and rerun on the full model as uncertain or for close lanes",
+    labels=("model", "stage")
+)
+IMAGES_DECODED = Counter(
+    "itms_images_decoded_total", "Images decoded from disk or upload bytes"
+)
+STREAM_FRAMES = Counter(
+    "itms_stream_frames_total", "Video frames read per source, decoded or dropped as stale",
+    labels=("source", "result")
+)
+MOTION_GATE = Counter(
+    "itms_motion_gate_total", "Lane frames checked by the motion gate: model skipped or run",
+    labels=("intersection", "result")
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "itms_inference_queue_depth", "Requests waiting for the shared model", labels=("priority",)
+)
+INFERENCE_REJECTED = Counter(
+    "itms_inference_rejected_total", "Requests turned away because the inference queue was full",
+    labels=("priority",)
+)
+CACHE_LOOKUPS = Counter(
+    "itms_detection_cache_lookups_total", "Detection cache lookups", labels=("result",)
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "itms_http_request_seconds", "HTTP request latency", labels=("endpoint", "method", "status")
+)
+CONTROL_TICK_DRIFT = Histogram(
+    "itms_control_tick_drift_seconds", "How much longer than 1 s each countdown tick took",
+    labels=("intersection",), buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+CONTROL_PHASE_DRIFT = Gauge(
+    "itms_control_phase_drift_seconds", "Accumulated countdown drift in the current phase",
+    labels=("intersection",)
+)
+PHASE_TRANSITIONS = Counter(
+    "itms_phase_transitions_total", "Traffic light phase changes", labels=("intersection", "phase")
+)
@@ -0,0 +1,276 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import torchvision
+
+from preprocess import scale_boxes
+from config import MODELS_DIR, YOLOV5_REPO_DIR, ALLOW_HUB_DOWNLOAD, INFERENCE_THREADS
+
+logger = logging.getLogger(__name__)
+
+# Search order for artifacts in MODELS_DIR when the registry has no entry
+ARTIFACT_SUFFIXES = (".torchscript", ".onnx", ".pt")
+REGISTRY_FILE = MODELS_DIR / "registry.json"
+
+
+def resolve_model(name):
+    """
+    Find the local artifact for a model name
+
+    ``models/registry.json`` may map a name to an explicit artifact, e.g.
+    ``{"yolov5l": {"path": "/opt/weights/yolov5l.onnx", "input_size": 640}}``.
+    Otherwise MODELS_DIR is searched for ``<name>.torchscript``,
+    ``<name>.onnx`` and ``<name>.pt`` in that order.
+
+    Returns:
+        dict: {"path": Path or None, "input_size": int}
+    """
+    entry = {"path": None, "input_size": 640}
+
+    if REGISTRY_FILE.exists():
+        with open(REGISTRY_FILE) as f:
+            registry = json.load(f)
+        if name in registry:
+            entry.update(registry[name])
+            path = Path(entry["path"])
+            entry["path"] = path if path.is_absolute() else MODELS_DIR / path
+            return entry
+
+    for suffix in ARTIFACT_SUFFIXES:
+        candidate = MODELS_DIR / f"{name}{suffix}"
+        if candidate.exists():
+            entry["path"] = candidate
+            break
+    return entry
+
+
+def load_model(name, optimized=False):
+    """
+    Load a detection model without touching the network when possible
+
+    TorchScript and ONNX exports are wrapped in ExportedModel; ``.pt``
+    weights are loaded through a local clone of the yolov5 repo. The
+    torch.hub download is only used as a last resort when
+    ALLOW_HUB_DOWNLOAD is set. With ``optimized`` ONNX exports are
+    quantized and torch models switched to channels-last (see optimize_model).
+    """
+    model = _load_artifact(name, quantize_onnx=optimized)
+    return optimize_model(model) if optimized else model
+
+
+def _load_artifact(name, quantize_onnx=False):
+    entry = resolve_model(name)
+    path = entry["path"]
+
+    if path is not None:
+        if not path.exists():
+            raise FileNotFoundError(f"Model artifact for {name} not found: {path}")
+        logger.info(f"Loading {name} from {path}")
+
+        if path.suffix == ".torchscript":
+            runner = torch.jit.load(str(path), map_location="cpu")
+            runner.eval()
+            return ExportedModel(runner, entry["input_size"])
+        if path.suffix == ".onnx":
+            if quantize_onnx:
+                path = quantize_onnx_model(path)
+            return ExportedModel(OnnxRunner(path), entry["input_size"])
+        if path.suffix == ".pt":
+            if YOLOV5_REPO_DIR is not None:
+                return torch.hub.load(str(YOLOV5_REPO_DIR), "custom", path=str(path), source="local")
+            if ALLOW_HUB_DOWNLOAD:
+                return torch.hub.load('ultralytics/yolov5', "custom", path=str(path))
+            raise FileNotFoundError(f"Loading {path} offline requires YOLOV5_REPO_DIR")
+
+    if not ALLOW_HUB_DOWNLOAD:
+        raise FileNotFoundError(
+            f"No offline artifact for {name} in {MODELS_DIR} and hub download is disabled"
+        )
+    logger.warning(f"No local artifact for {name}, falling back to torch.hub")
+    return torch.hub.load('ultralytics/yolov5', name, pretrained=True)
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Size torch's CPU thread pools; None keeps torch's default"""
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # Only allowed before the first inter-op parallel work in the process
+            logger.warning(f"Inter-op thread pool already started; keeping {torch.get_num_interop_threads()} threads")
+
+
+def optimize_model(model):
+    """
+    Prepare a loaded model for faster CPU inference
+
+    INT8 is limited to ONNX exports, which are quantized when loaded
+    (quantize_onnx_model). torch has no dynamic INT8 convolution and YOLOv5
+    is all convolutions, so torch modules and TorchScript exports stay fp32
+    and only get channels-last weights / input, which oneDNN convolutions
+    run faster on.
+    """
+    if isinstance(model, ExportedModel):
+        if isinstance(model.runner, torch.jit.ScriptModule):
+            model.memory_format = torch.channels_last
+        return model
+
+    logger.info("torch weights stay fp32 in optimized mode; export to ONNX for INT8")
+    return model.to(memory_format=torch.channels_last)
+
+
+def quantize_onnx_model(path):
+    """INT8 copy of an ONNX export, written next to it and rebuilt when the export changes"""
+    target = path.with_name(f"{path.stem}.int8.onnx")
+    if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+        return target
+
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("onnxruntime is required to quantize .onnx models") from e
+
+    logger.info(f"Quantizing {path.name} to INT8")
+    quantize_dynamic(str(path), str(target), weight_type=QuantType.QInt8)
+    return target
+
+
+class OnnxRunner:
+    """Minimal callable around an onnxruntime session"""
+
+    def __init__(self, path):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("onnxruntime is required to load .onnx models") from e
+
+        options = onnxruntime.SessionOptions()
+        if INFERENCE_THREADS:
+            options.intra_op_num_threads = INFERENCE_THREADS
+        self.session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exports without --dynamic only accept a batch of one
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+    def __call__(self, tensor):
+        batch = tensor.numpy()
+        if self.fixed_batch == 1 and batch.shape[0] > 1:
+            outputs = [self.session.run(None, {self.input_name: batch[i:i + 1]})[0] for i in range(batch.shape[0])]
+            return torch.from_numpy(np.concatenate(outputs))
+        return torch.from_numpy(self.session.run(None, {self.input_name: batch})[0])
+
+
+class Detections:
+    """Subset of the yolov5 Detections interface used by this project
+
+    ``t`` holds (preprocess, inference, NMS) time in ms per image, like
+    yolov5's own Detections.
+    """
+
+    def __init__(self, xyxy, t=(0.0, 0.0, 0.0)):
+        self.xyxy = xyxy
+        self.t = t
+
+
+class ExportedModel:
+    """
+    Give a raw exported yolov5 network the same call interface as the
+    torch.hub AutoShape model: letterbox, forward, NMS, rescale to the
+    original image, and return an object with a ``.xyxy`` list.
+    """
+
+    def __init__(self, runner, input_size=640, conf=0.25, iou=0.45, max_det=1000):
+        self.runner = runner
+        self.input_size = input_size
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.memory_format = torch.contiguous_format
+
+    def eval(self):
+        return self
+
+    def __call__(self, imgs):
+        # Raw tensors (e.g. warm-up input) go straight to the network
+        if isinstance(imgs, torch.Tensor):
+            return self._forward(imgs)
+
+        if isinstance(imgs, np.ndarray):
+            imgs = [imgs]
+
+        t0 = time.perf_counter()
+        batch, metas = [], []
+        for img in imgs:
+            padded, ratio, pad = letterbox(img, self.input_size)
+            batch.append(padded)
+            metas.append((ratio, pad, img.shape[:2]))
+
+        # Normalize once, on the model-size uint8 batch
+        tensor = torch.from_numpy(np.stack(batch)).permute(0, 3, 1, 2).float().div_(255.0)
+        tensor = tensor.contiguous(memory_format=self.memory_format)
+
+        t1 = time.perf_counter()
+        with torch.no_grad():
+            pred = self._forward(tensor)
+        t2 = time.perf_counter()
+
+        xyxy = []
+        for det, meta in zip(non_max_suppression(pred, self.conf, self.iou, self.max_det), metas):
+            xyxy.append(scale_boxes(det, *meta))
+        t3 = time.perf_counter()
+
+        n = max(len(imgs), 1)
+        return Detections(xyxy, tuple((b - a) * 1e3 / n for a, b in ((t0, t1), (t1, t2), (t2, t3))))
+
+    def _forward(self, tensor):
+        out = self.runner(tensor)
+        # yolov5 exports return (pred,) or (pred, feature_maps)
+        if isinstance(out, (list, tuple)):
+            out = out[0]
+        return out
+
+
+def letterbox(img, new_size=640, color=114):
+    """Resize keeping aspect ratio and pad to a new_size x new_size square"""
+    h, w = img.shape[:2]
+    # Already letterboxed (see preprocess.letterbox_into)
+    if (h, w) == (new_size, new_size):
+        return img, 1.0, (0, 0)
+    ratio = min(new_size / h, new_size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_w, pad_h = (new_size - new_w) // 2, (new_size - new_h) // 2
+    img = cv2.copyMakeBorder(
+        img, pad_h, new_size - new_h - pad_h, pad_w, new_size - new_w - pad_w,
+        cv2.BORDER_CONSTANT, value=(color, color, color)
+    )
+    return img, ratio, (pad_w, pad_h)
+
+
+def non_max_suppression(pred, conf_thres=0.25, iou_thres=0.45, max_det=1000):
+    """yolov5-style NMS over a (batch, anchors, 5 + classes) prediction tensor"""
+    output = []
+    for x in pred:
+        x = x[x[:, 4] > conf_thres]
+        if not x.shape[0]:
+            output.append(torch.zeros((0, 6)))
+            continue
+
+        scores = x[:, 5:] * x[:, 4:5]
+        conf, cls = scores.max(1, keepdim=True)
+        boxes = torch.cat((x[:, :2] - x[:, 2:4] / 2, x[:, :2] + x[:, 2:4] / 2), 1)
+        x = torch.cat((boxes, conf, cls.float()), 1)[conf.view(-1) > conf_thres]
+
+        keep = torchvision.ops.batched_nms(x[:, :4], x[:, 4], x[:, 5].long(), iou_thres)[:max_det]
+        output.append(x[keep])
+    return output
@@ -0,0 +1,89 @@
+import threading
+
+import cv2
+import numpy as np
+
+from metrics import MOTION_GATE
+
+
+class MotionGate:
+    """
+    Reuses a lane's last detection result while its camera view is unchanged
+
+    Each frame is reduced to a small grayscale thumbnail. If its mean
+    absolute difference from the thumbnail of the lane's last *scored*
+    frame is below ``threshold`` (a fraction of full scale), the model is
+    skipped and the previous result reused. Comparing against the last
+    scored frame rather than the previous one means slow changes still
+    accumulate, and ``max_skips`` forces a fresh pass now and then.
+
+    A reused result is remembered with the frame's key, so checking the
+    same frame again (e.g. a waiting lane on every prefetch) returns it
+    without counting another skip.
+    """
+
+    def __init__(self, threshold=0.02, max_skips=20, size=32, name="default"):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.size = size
+        self.name = name
+        self.skipped = 0
+        self.inferred = 0
+        self._refs = {}  # lane -> [thumbnail, (details, weight), consecutive skips]
+        self._reused = {}  # lane -> (frame key, (details, weight)) of the last skipped frame
+        self._lock = threading.Lock()
+
+    @property
+    def skip_rate(self):
+        checked = self.skipped + self.inferred
+        return self.skipped / checked if checked else 0.0
+
+    def thumbnail(self, image):
+        # Subsample before resizing so 4K frames cost about as much as small ones
+        step = max(min(image.shape[:2]) // (self.size * 4), 1)
+        small = cv2.resize(image[::step, ::step], (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def check(self, lane, image, key=None):
+        """
+        Args:
+            key (str): Identifies the frame's content; None for frames that
+                are never checked twice
+
+        Returns:
+            tuple: (result, thumbnail) - the lane's previous (details, weight)
+            if the image is effectively unchanged, else None; pass the
+            thumbnail to update() after scoring
+        """
+        with self._lock:
+            reused = self._reused.get(lane)
+            if key is not None and reused is not None and reused[0] == key:
+                details, weight = reused[1]
+                return (dict(details), weight), None
+
+        thumb = self.thumbnail(image)
+        with self._lock:
+            ref = self._refs.get(lane)
+            if ref is not None and ref[2] < self.max_skips:
+                change = float(np.mean(cv2.absdiff(thumb, ref[0]))) / 255.0
+                if change < self.threshold:
+                    ref[2] += 1
+                    self.skipped += 1
+                    self._reused[lane] = (key, ref[1])
+                    MOTION_GATE.inc(intersection=self.name, result="skipped")
+                    details, weight = ref[1]
+                    return (dict(details), weight), thumb
+        return None, thumb
+
+    def update(self, lane, thumb, result):
+        """Record a freshly scored frame as the lane's reference"""
+        with self._lock:
+            self._refs[lane] = [thumb, result, 0]
+            self._reused.pop(lane, None)
+            self.inferred += 1
+        MOTION_GATE.inc(intersection=self.name, result="inferred")
+
+    def reset(self):
+        with self._lock:
+            self._refs.clear()
+            self._reused.clear()
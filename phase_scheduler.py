@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import CONTROL_TICK_DRIFT, CONTROL_PHASE_DRIFT, PHASE_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+
+class WallClock:
+    """Real time; used in production"""
+
+    realtime = True
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated time that advances instantly when slept on"""
+
+    realtime = False
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += seconds
+
+
+class InlineExecutor:
+    """Executor that runs work immediately on the calling thread.
+
+    Under a virtual clock, waiting for the model costs no simulated time,
+    so scoring runs inline and results are deterministic.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class PhaseScheduler:
+    """
+    Explicit state machine for the green/yellow light cycle
+
+    States, advanced one countdown second per step():
+      green     - lane is green and lanes are re-scored in the background
+      deciding  - the green lane's image was replaced at the yellow lead
+                  and lane_calc() is running; lights stay green
+      yellow    - the next lane is known; current and next show yellow
+      None      - stopped, or no next lane could be chosen
+
+    When the countdown reaches zero the next lane becomes green, so a
+    long run is a flat loop instead of one recursive call per phase.
+    """
+
+    def __init__(self, system, clock=None, executor=None):
+        self.system = system
+        self.clock = clock or WallClock()
+        if executor is None:
+            executor = system._prefetch_pool if self.clock.realtime else InlineExecutor()
+        self.executor = executor
+        self.state = None
+        self.lane = None
+        self.next_lane, self.next_time = None, 0
+        self.phase_drift = 0.0
+        self._prefetch = None
+        self._decision = None
+
+    def run(self, lane, duration):
+        self.begin_green(lane, duration)
+        while self.state is not None and self.system.is_running:
+            self.step()
+
+    def begin_green(self, lane, duration):
+        s = self.system
+        self.state = "green"
+        self.lane = lane
+        self.next_lane, self.next_time = None, 0
+        self._prefetch, self._decision = None, None
+        self.phase_drift = 0.0
+
+        with s.state_update():
+            s.lane_time = duration
+            s.green_lane = lane
+            s.yellow_lanes = []
+        logger.info(f"Opening Lane {lane} for {duration} seconds")
+        PHASE_TRANSITIONS.inc(intersection=s.name, phase="green")
+        s.record_phase("green", lane, duration)
+        s.display_lanes()
+
+    def step(self):
+        """Advance the state machine by one countdown second"""
+        s = self.system
+        tick_start = self.clock.now()
+        logger.debug("Time remaining: %ss", s.lane_time)
+
+        if self.state == "green":
+            # Keep re-scoring while the lane is green; the detection cache
+            # makes unchanged images free
+            if self._prefetch is None or self._prefetch.done():
+                self._prefetch = self.executor.submit(s.prefetch_lane_scores, self.lane)
+
+            if s.lane_time <= s.yellow_lead and s.replace_lane_image(self.lane):
+                self._decision = self.executor.submit(s.lane_calc)
+                self.state = "deciding"
+
+        if self.state == "deciding" and self._decision.done():
+            self.begin_yellow(*self._decision.result())
+
+        self.tick(tick_start)
+        if s.lane_time <= 0 or not s.is_running:
+            self.end_phase()
+
+    def begin_yellow(self, next_lane, next_time):
+        s = self.system
+        self.state = "yellow"
+        self.next_lane, self.next_time = next_lane, next_time
+        with s.state_update():
+            s.yellow_lanes = [self.lane, next_lane]
+            s.green_lane = None
+        s.display_lanes()
+        PHASE_TRANSITIONS.inc(intersection=s.name, phase="yellow")
+        s.record_phase("yellow", self.lane, s.lane_time)
+        logger.info("YELLOW PHASE: Preparing transition...")
+
+    def end_phase(self):
+        s = self.system
+        if not s.is_running:
+            self.state = None
+            return
+
+        # Only blocks if scoring took longer than the whole yellow lead
+        if self.state == "deciding":
+            self.next_lane, self.next_time = self._decision.result()
+
+        if self.next_lane:
+            logger.info("Transition complete")
+            self.begin_green(self.next_lane, self.next_time)
+        else:
+            self.state = None
+
+    def tick(self, tick_start):
+        """Sleep out one countdown second and record how late it finished"""
+        s = self.system
+        self.clock.sleep(1)
+        with s.state_update():
+            s.lane_time -= 1
+        if self.clock.realtime:
+            overrun = max(self.clock.now() - tick_start - 1, 0.0)
+            self.phase_drift += overrun
+            CONTROL_TICK_DRIFT.observe(overrun, intersection=s.name)
+            CONTROL_PHASE_DRIFT.set(self.phase_drift, intersection=s.name)
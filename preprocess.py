@@ -0,0 +1,88 @@
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+
+def letterbox_into(img, out, color=114):
+    """
+    Resize keeping aspect ratio and pad into a preallocated square uint8 buffer
+
+    Unlike model_registry.letterbox, nothing is allocated at the source
+    resolution: the frame is resized straight into ``out`` (size x size x 3)
+    and only the padding strips are filled.
+
+    Returns:
+        tuple: (out, ratio, (pad_w, pad_h))
+    """
+    size = out.shape[0]
+    h, w = img.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_w, pad_h = (size - new_w) // 2, (size - new_h) // 2
+
+    region = out[pad_h:pad_h + new_h, pad_w:pad_w + new_w]
+    if (new_w, new_h) == (w, h):
+        region[...] = img
+    else:
+        resized = cv2.resize(img, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+        # OpenCV falls back to a fresh array if it cannot write into the view
+        if not np.shares_memory(resized, out):
+            region[...] = resized
+
+    out[:pad_h] = color
+    out[pad_h + new_h:] = color
+    out[pad_h:pad_h + new_h, :pad_w] = color
+    out[pad_h:pad_h + new_h, pad_w + new_w:] = color
+    return out, ratio, (pad_w, pad_h)
+
+
+def scale_boxes(det, ratio, pad, shape):
+    """
+    Map (x1, y1, x2, y2, ...) rows from letterboxed back to original image coordinates
+
+    Works on a copy: model outputs made under torch.inference_mode (see
+    VehicleDetector.inference_context) cannot be updated in place once the
+    context has exited.
+    """
+    if ratio == 1 and pad == (0, 0):
+        return det
+    pad_w, pad_h = pad
+    h, w = shape
+    det = det.clone()
+    det[:, [0, 2]] = ((det[:, [0, 2]] - pad_w) / ratio).clamp(0, w)
+    det[:, [1, 3]] = ((det[:, [1, 3]] - pad_h) / ratio).clamp(0, h)
+    return det
+
+
+class LetterboxBuffers:
+    """
+    Reusable uint8 model-input buffers
+
+    Buffers are kept per key (the lane, or the slot in a batch) and size,
+    so steady-state preprocessing allocates nothing. A key borrowed by two
+    threads at once simply gets a second buffer.
+    """
+
+    def __init__(self, max_per_key=2):
+        self.max_per_key = max_per_key
+        self._free = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+
+    @contextmanager
+    def borrow(self, key=None, size=640):
+        with self._lock:
+            free = self._free.setdefault((key, size), [])
+            buf = free.pop() if free else None
+            if buf is None:
+                self.allocations += 1
+        if buf is None:
+            buf = np.empty((size, size, 3), dtype=np.uint8)
+        try:
+            yield buf
+        finally:
+            with self._lock:
+                if len(free) < self.max_per_key:
+                    free.append(buf)
@@ -0,0 +1,80 @@
+import hashlib
+
+import numpy as np
+import torch
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    Even-odd point-in-polygon test, vectorized over all points and edges
+
+    Args:
+        x, y (np.ndarray): Point coordinates, shape (n,)
+        polygon (np.ndarray): Vertices, shape (m, 2), in the same units
+
+    Returns:
+        np.ndarray: Boolean mask of shape (n,)
+    """
+    px, py = polygon[:, 0], polygon[:, 1]
+    qx, qy = np.roll(px, -1), np.roll(py, -1)
+    x, y = x[:, None], y[:, None]
+
+    # Edges straddling each point's horizontal line, and where they cross it
+    straddles = (py > y) != (qy > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = px + (y - py) * (qx - px) / (qy - py)
+    return np.count_nonzero(straddles & (x < x_cross), axis=1) % 2 == 1
+
+
+class LaneROI:
+    """
+    Region of interest of one lane's camera
+
+    The polygon is given in normalized image coordinates ((0, 0) top-left,
+    (1, 1) bottom-right) so it survives resolution changes. The detector
+    only sees the polygon's bounding box, and a detection counts when the
+    bottom-centre of its box, where the vehicle meets the road, lies inside
+    the polygon.
+    """
+
+    def __init__(self, polygon):
+        self.polygon = np.asarray(polygon, dtype=np.float64)
+        if self.polygon.ndim != 2 or self.polygon.shape[1] != 2 or len(self.polygon) < 3:
+            raise ValueError(f"ROI polygon needs at least 3 (x, y) points, got {polygon}")
+        # Part of the detection-cache key, since results depend on the ROI
+        self.key = hashlib.blake2b(self.polygon.tobytes(), digest_size=8).hexdigest()
+
+    def bounds(self, shape):
+        """Pixel bounding box (x0, y0, x1, y1) of the polygon in an image of this shape"""
+        h, w = shape[:2]
+        xs, ys = self.polygon[:, 0] * w, self.polygon[:, 1] * h
+        x0 = min(max(int(np.floor(xs.min())), 0), w - 1)
+        y0 = min(max(int(np.floor(ys.min())), 0), h - 1)
+        x1 = max(min(int(np.ceil(xs.max())), w), x0 + 1)
+        y1 = max(min(int(np.ceil(ys.max())), h), y0 + 1)
+        return x0, y0, x1, y1
+
+    def crop(self, image):
+        """View of the polygon's bounding box (no copy)"""
+        x0, y0, x1, y1 = self.bounds(image.shape)
+        return image[y0:y1, x0:x1]
+
+    def filter(self, det, shape):
+        """
+        Keep the detections inside the polygon
+
+        Args:
+            det (Detections): Boxes in crop coordinates
+            shape (tuple): Shape of the full image the crop was taken from
+        """
+        if len(det) == 0:
+            return det
+        h, w = shape[:2]
+        x0, y0, _, _ = self.bounds(shape)
+        boxes = det.boxes.numpy().astype(np.float64)
+        inside = points_in_polygon(
+            (boxes[:, 0] + boxes[:, 2]) / 2 + x0,
+            boxes[:, 3] + y0,
+            self.polygon * (w, h)
+        )
+        return det[torch.from_numpy(inside)]
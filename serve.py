@@ -0,0 +1,94 @@
+"""
+Run the API as several processes on one machine
+
+    python serve.py --workers 8 --port 5000
+
+One inference process owns the model, one control process runs the
+control loop of every intersection, and --workers HTTP processes share
+the listening socket and talk to both over local manager connections
+(addresses in config.py, with a random key per run). Frames cross process
+boundaries through shared memory. Only the inference process holds the
+model, so adding HTTP workers adds no model memory.
+
+If any process exits, the others are stopped.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import time
+
+from config import LOG_LEVEL, SERVE_CONTROL_ADDRESS, SERVE_HTTP_WORKERS, SERVE_INFERENCE_ADDRESS
+
+logger = logging.getLogger("serve")
+
+
+def run_inference(authkey):
+    from inference_server import serve_inference
+    serve_inference(SERVE_INFERENCE_ADDRESS, authkey)
+
+
+def run_control(authkey):
+    from control_server import serve_control
+    serve_control(SERVE_CONTROL_ADDRESS, authkey, SERVE_INFERENCE_ADDRESS)
+
+
+def run_http_worker(sock):
+    from werkzeug.serving import make_server
+    from app import app
+    host, port = sock.getsockname()[:2]
+    make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the traffic system with a dedicated inference process")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=SERVE_HTTP_WORKERS, help="HTTP worker processes")
+    args = parser.parse_args()
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    authkey = secrets.token_bytes(32)
+    # Read by app.py in the HTTP workers
+    os.environ["ITMS_SERVE_AUTHKEY"] = authkey.hex()
+
+    # Model and control loop in fresh interpreters; HTTP workers are forked
+    # so they inherit the listening socket (nothing heavy is loaded here yet)
+    spawn = multiprocessing.get_context("spawn")
+    processes = [
+        spawn.Process(target=run_inference, args=(authkey,), name="inference"),
+        spawn.Process(target=run_control, args=(authkey,), name="control"),
+    ]
+    sock = socket.create_server((args.host, args.port), backlog=128)
+    sock.set_inheritable(True)
+    fork = multiprocessing.get_context("fork")
+    processes += [fork.Process(target=run_http_worker, args=(sock,), name=f"http-{i}") for i in range(args.workers)]
+
+    for process in processes:
+        process.start()
+    logger.info(f"Serving on http://{args.host}:{args.port} with {args.workers} HTTP workers")
+
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(1)
+        dead = [process.name for process in processes if not process.is_alive()]
+        logger.error(f"{', '.join(dead)} exited; shutting down")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Replay a directory of captured frames through the real lane_calc policy
+
+Runs the phase state machine on a virtual clock, so hours of signal
+timing are simulated in as long as scoring the frames takes. Frames are
+consumed in name order and are never moved. Use it to compare timing
+parameters:
+
+    python simulate.py --frames captures/ --base-green-time 25 --yellow-lead 10
+    python simulate.py --frames captures/ --detector yolov5s --output sim.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmark import build_detector
+from main import TrafficSystem
+from phase_scheduler import PhaseScheduler, VirtualClock
+
+
+class RecordingScheduler(PhaseScheduler):
+    """PhaseScheduler that records every green phase it opens"""
+
+    def __init__(self, system, clock, max_phases=None):
+        super().__init__(system, clock)
+        self.max_phases = max_phases
+        self.phases = []
+
+    def begin_green(self, lane, duration):
+        if self.max_phases is not None and len(self.phases) >= self.max_phases:
+            self.system.is_running = False
+            self.state = None
+            return
+        super().begin_green(lane, duration)
+        self.phases.append({
+            "start": self.clock.now(),
+            "lane": lane,
+            "duration": duration,
+            # The counts lane_calc() just chose this phase from
+            "weights": list(self.system.last_counts),
+        })
+
+
+def summarize(phases, end_time, lanes=4):
+    served = defaultdict(int)
+    green_seconds = defaultdict(float)
+    waits = defaultdict(list)
+    last_green_end = {lane: 0.0 for lane in range(1, lanes + 1)}
+
+    for phase in phases:
+        lane = phase["lane"]
+        served[lane] += 1
+        green_seconds[lane] += phase["duration"]
+        waits[lane].append(phase["start"] - last_green_end[lane])
+        last_green_end[lane] = phase["start"] + phase["duration"]
+
+    durations = [p["duration"] for p in phases]
+    return {
+        "phases": len(phases),
+        "simulated_seconds": end_time,
+        "mean_green_seconds": round(sum(durations) / len(durations), 2) if durations else 0,
+        "max_green_seconds": max(durations, default=0),
+        "lanes": {
+            lane: {
+                "phases": served[lane],
+                "green_seconds": green_seconds[lane],
+                "max_wait_seconds": max(waits[lane], default=end_time),
+                "mean_wait_seconds": round(sum(waits[lane]) / len(waits[lane]), 2) if waits[lane] else end_time,
+            }
+            for lane in range(1, lanes + 1)
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured frames through the lane policy on a virtual clock")
+    parser.add_argument("--frames", type=Path, required=True, help="Directory of captured lane images")
+    parser.add_argument("--detector", default="stub", help="'stub' or a model name from the local registry")
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    parser.add_argument("--cascade", help="First-stage model (e.g. yolov5s) to run in front of --detector")
+    parser.add_argument("--base-green-time", type=int, default=30)
+    parser.add_argument("--yellow-lead", type=int, default=15)
+    parser.add_argument("--max-phases", type=int, help="Stop after this many green phases")
+    parser.add_argument("--output", type=Path, help="Write the phase log and summary as JSON")
+    args = parser.parse_args()
+
+    clock = VirtualClock()
+    wall_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = build_detector(args.detector, args.stub_latency, cascade=args.cascade)
+        # In-memory cache only, so replays never read or fill the shared store
+        system = TrafficSystem(
+            detector=detector, cache_db_path=None, input_dir=args.frames, keep_audit_trail=False, clock=clock
+        )
+        system.base_green_time = args.base_green_time
+        system.yellow_lead = args.yellow_lead
+
+        scheduler = RecordingScheduler(system, clock, args.max_phases)
+        system.is_running = True
+        if not system.initialize_lanes():
+            raise SystemExit(f"Need at least 4 frames in {args.frames}")
+        first_lane, first_time = system.lane_calc()
+        scheduler.run(first_lane, first_time)
+        system.is_running = False
+        system.intake.stop()
+    wall_seconds = time.perf_counter() - wall_start
+
+    summary = summarize(scheduler.phases, clock.now(), lanes=system.lane_count)
+    summary["wall_seconds"] = round(wall_seconds, 2)
+    if system.motion_gate is not None:
+        summary["motion_gate_skip_rate"] = round(system.motion_gate.skip_rate, 3)
+    if detector.cascade:
+        summary["cascade"] = {"frames": dict(detector.cascade_counts), "escalation_rate": round(detector.escalation_rate, 3)}
+    summary["speedup"] = round(clock.now() / wall_seconds, 1) if wall_seconds else None
+    summary["parameters"] = {"base_green_time": args.base_green_time, "yellow_lead": args.yellow_lead, "detector": args.detector, "cascade": args.cascade}
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "phases": scheduler.phases}, f, indent=2)
+        print(f"Phase log written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+from frame_store import Frame
+from metrics import STREAM_FRAMES
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_source(source):
+    """Device indices may be given as ints or digit strings; anything else is a path or URL"""
+    if isinstance(source, int):
+        return source
+    source = str(source)
+    return int(source) if source.isdigit() else source
+
+
+class LatestFrameReader:
+    """
+    Reads one video source on its own thread and keeps only the newest frame
+
+    ``source`` is a device index, a local video file or a stream URL
+    (rtsp://, http:// MJPEG, ...). Every frame is grabbed so the source
+    never backs up, but at most ``sample_fps`` frames per second are
+    converted to BGR; the rest are dropped as stale. Local files are played
+    at their native frame rate and looped, so they stand in for a live
+    camera. A source that fails or ends is reopened after
+    ``reconnect_delay`` seconds.
+    """
+
+    def __init__(self, source, sample_fps=5.0, reconnect_delay=2.0, name=None):
+        self.source = _parse_source(source)
+        self.name = name or str(source)
+        self.sample_fps = sample_fps
+        self.reconnect_delay = reconnect_delay
+        self.is_file = isinstance(self.source, str) and Path(self.source).is_file()
+        self._frame = None
+        self._captured_at = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"stream-{self.name}")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.reconnect_delay + 1)
+            self._thread = None
+        with self._cond:
+            self._frame = None
+            self._captured_at = None
+
+    def latest(self, max_age=None):
+        """The newest frame, or None if there is none (or it is older than max_age seconds)"""
+        with self._cond:
+            if self._frame is None:
+                return None
+            if max_age is not None and time.monotonic() - self._captured_at > max_age:
+                return None
+            return self._frame
+
+    def wait_for_frame(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self._frame is not None, timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            cap = cv2.VideoCapture(self.source)
+            if not cap.isOpened():
+                logger.warning(f"Could not open stream {self.name}; retrying in {self.reconnect_delay}s")
+                self._stop.wait(self.reconnect_delay)
+                continue
+
+            # Live sources should hand over the newest frame, not a backlog
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            logger.info(f"Stream {self.name} opened")
+            self._read_frames(cap)
+            cap.release()
+
+            if not self._stop.is_set():
+                logger.warning(f"Stream {self.name} ended; reconnecting in {self.reconnect_delay}s")
+                self._stop.wait(self.reconnect_delay)
+
+    def _read_frames(self, cap):
+        frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25.0) if self.is_file else 0.0
+        sample_interval = 1.0 / self.sample_fps if self.sample_fps else 0.0
+        next_frame = next_sample = time.monotonic()
+        rewound = False
+
+        while not self._stop.is_set():
+            if not cap.grab():
+                # Loop local files; stop if the file won't even restart
+                if self.is_file and not rewound:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    rewound = True
+                    continue
+                return
+            rewound = False
+
+            now = time.monotonic()
+            if frame_interval:
+                next_frame += frame_interval
+                if next_frame > now:
+                    self._stop.wait(next_frame - now)
+                    now = time.monotonic()
+                else:
+                    next_frame = now
+
+            if now < next_sample:
+                STREAM_FRAMES.inc(source=self.name, result="dropped")
+                continue
+            ok, image = cap.retrieve()
+            if not ok:
+                continue
+            next_sample = now + sample_interval
+            STREAM_FRAMES.inc(source=self.name, result="decoded")
+
+            # Stream frames are never seen twice, so they get no cache key
+            with self._cond:
+                self._frame = Frame(self.name, None, image)
+                self._captured_at = now
+                self._cond.notify_all()
+
+
+class StreamIntake:
+    """
+    Lane images taken from live video instead of an input directory
+
+    Each lane is bound to one source and always scores that source's newest
+    frame. Frames older than ``max_age`` seconds (e.g. from a stalled
+    camera) are treated as missing.
+    """
+
+    def __init__(self, sources, sample_fps=5.0, max_age=5.0, reconnect_delay=2.0, name="default"):
+        self.max_age = max_age
+        self.readers = {
+            int(lane): LatestFrameReader(source, sample_fps, reconnect_delay, name=f"{name}-lane{lane}")
+            for lane, source in sources.items()
+        }
+
+    def start(self):
+        for reader in self.readers.values():
+            reader.start()
+
+    def stop(self):
+        for reader in self.readers.values():
+            reader.stop()
+
+    def latest(self, lane):
+        reader = self.readers.get(lane)
+        return reader.latest(self.max_age) if reader is not None else None
+
+    def has_frame(self, lane):
+        return self.latest(lane) is not None
+
+    def wait_for_frames(self, timeout=None):
+        """Wait until every source has produced a frame; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for reader in self.readers.values():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not reader.wait_for_frame(remaining):
+                return False
+        return True
@@ -0,0 +1,77 @@
+"""
+Local MJPEG-over-HTTP server that stands in for lane cameras
+
+Cycles the JPEGs in a directory as endless multipart streams, so stream
+intake can be exercised without real cameras:
+
+    python stream_server.py --images input_imgs --fps 10
+    # LANE_STREAMS = {n: f"http://localhost:8081/lane{n}.mjpg" for n in range(1, 5)}
+
+Every /lane<N>.mjpg serves the same images starting N images apart, so
+the lanes see different traffic.
+"""
+import argparse
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BOUNDARY = "frame"
+LANE_PATH = re.compile(r"^/lane(\d+)\.mjpg$")
+
+
+def make_handler(frames, fps):
+    class MjpegHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = LANE_PATH.match(self.path)
+            if match is None:
+                self.send_error(404, "Use /lane<N>.mjpg")
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            index = int(match.group(1))
+            next_frame = time.monotonic()
+            try:
+                while True:
+                    data = frames[index % len(frames)]
+                    self.wfile.write(
+                        f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                    )
+                    self.wfile.write(data + b"\r\n")
+                    index += 1
+                    next_frame += 1.0 / fps
+                    time.sleep(max(next_frame - time.monotonic(), 0))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return MjpegHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a directory of JPEGs as looping MJPEG lane streams")
+    parser.add_argument("--images", type=Path, default=Path(__file__).parent / "input_imgs")
+    parser.add_argument("--fps", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    frames = [f.read_bytes() for f in sorted(args.images.iterdir()) if f.suffix.lower() in (".jpg", ".jpeg")]
+    if not frames:
+        raise SystemExit(f"No JPEGs in {args.images}")
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(frames, args.fps))
+    print(f"Serving {len(frames)} frames at {args.fps} fps on http://localhost:{args.port}/lane<N>.mjpg")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+import torch
+
+from config import CASCADE_UNCERTAIN_BAND, DETECTION_CONF_THRESHOLD
+from model_registry import Detections, letterbox
+from vehicle_detector import VehicleDetector
+
+
+class StubModel:
+    """
+    Deterministic stand-in for the YOLOv5 hub model
+
+    Detections are derived from a seed computed from the image pixels, so
+    the same image always yields the same boxes, classes and confidences.
+    Images are still letterboxed so preprocessing cost stays realistic, and
+    ``latency`` (seconds per image) can simulate a model forward pass. Like
+    the hub model, boxes below ``conf`` are not reported.
+    """
+
+    # COCO ids: mostly vehicle classes plus a few that should be ignored
+    CLASS_POOL = np.array([0, 1, 2, 2, 2, 3, 5, 7, 7, 9])
+
+    def __init__(self, latency=0.0, input_size=640, max_boxes=30, conf=0.25):
+        self.latency = latency
+        self.conf = conf
+        self.input_size = input_size
+        self.max_boxes = max_boxes
+
+    def eval(self):
+        return self
+
+    def __call__(self, imgs):
+        if isinstance(imgs, torch.Tensor):
+            return torch.zeros((imgs.shape[0], 0, 85))
+        if isinstance(imgs, np.ndarray):
+            imgs = [imgs]
+
+        t0 = time.perf_counter()
+        for img in imgs:
+            letterbox(img, self.input_size)
+        t1 = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency * len(imgs))
+        t2 = time.perf_counter()
+        xyxy = [self._fake_detections(img) for img in imgs]
+        t3 = time.perf_counter()
+
+        n = max(len(imgs), 1)
+        return Detections(xyxy, tuple((b - a) * 1e3 / n for a, b in ((t0, t1), (t1, t2), (t2, t3))))
+
+    def _fake_detections(self, img):
+        h, w = img.shape[:2]
+        seed = int(img[::32, ::32].sum()) % (2 ** 32)
+        rng = np.random.default_rng(seed)
+        n = int(rng.integers(0, self.max_boxes + 1))
+
+        x1 = rng.uniform(0, w * 0.9, n)
+        y1 = rng.uniform(0, h * 0.9, n)
+        x2 = np.minimum(x1 + rng.uniform(10, w * 0.2, n), w)
+        y2 = np.minimum(y1 + rng.uniform(10, h * 0.2, n), h)
+        conf = rng.uniform(0.1, 1.0, n)
+        cls = rng.choice(self.CLASS_POOL, n)
+        rows = np.stack([x1, y1, x2, y2, conf, cls], axis=1) if n else np.zeros((0, 6))
+        return torch.from_numpy(rows[rows[:, 4] > self.conf].astype(np.float32))
+
+
+class StubDetector(VehicleDetector):
+    """VehicleDetector backed by StubModel, for running without weights"""
+
+    def __init__(self, latency=0.0, optimized=False, cascade=None, min_conf=None):
+        self.latency = latency
+        super().__init__(model_name='stub', background=False, optimized=optimized, cascade=cascade, min_conf=min_conf)
+
+    def _build_first_stage(self, name, background):
+        # Same fake boxes, at a fifth of the latency
+        return StubDetector(
+            latency=self.latency / 5,
+            optimized=self.optimized,
+            min_conf=DETECTION_CONF_THRESHOLD - CASCADE_UNCERTAIN_BAND
+        )
+
+    def _load_model(self):
+        self._model = StubModel(self.latency)
+        if self.min_conf is not None:
+            self._model.conf = self.min_conf
+        self._ready.set()
@@ -1,29 +1,40 @@
-import os
 import shutil
-import time
 from pathlib import Path
 import cv2
-import torch
+from detections import ClassWeights, Detections
+from model_registry import load_model
+from preprocess import LetterboxBuffers, letterbox_into
+from image_intake import ImageIntake
+from config import IMAGE_EXTS, INTAKE_POLL_INTERVAL, HISTORY_DB_PATH, HISTORY_FLUSH_INTERVAL, HISTORY_BUFFER_SIZE
+from history import HistoryStore
 
 class VehicleDetector:
     def __init__(self):
         """Initialize YOLOv5 model for vehicle detection"""
         print("Loading YOLOv5 model...")
-        self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
+        self.model = load_model('yolov5s')
         self.model.eval()
         self.vehicle_classes = [2, 3, 5, 7]  # COCO classes: car, motorcycle, bus, truck
+        self.class_weights = ClassWeights({cls: (str(cls), 1.0) for cls in self.vehicle_classes})
+        self.input_size = getattr(self.model, "input_size", 640)
+        self.buffers = LetterboxBuffers()
         print("Model loaded successfully!")
 
-    def count_vehicles(self, image_path):
+    def count_vehicles(self, image_path, lane=None):
         """Count vehicles in an image"""
         img = cv2.imread(str(image_path))
         if img is None:
             print(f"Error: Could not read image {image_path}")
             return 0
-            
-        results = self.model(img)
-        return sum(1 for *_, conf, cls in results.xyxy[0] 
-               if int(cls) in self.vehicle_classes and conf > 0.5)
+
+        # Letterbox into the lane's reused model-size buffer; counting
+        # doesn't need the boxes mapped back to the original image
+        with self.buffers.borrow(lane, self.input_size) as buf:
+            padded, _, _ = letterbox_into(img, buf)
+            cv2.cvtColor(padded, cv2.COLOR_BGR2RGB, dst=padded)
+            results = self.model(padded)
+        det = Detections.from_xyxy(results.xyxy[0])
+        return self.class_weights.total(det[det.scores > 0.5])
 
 class ImageProcessor:
     def __init__(self):
@@ -37,15 +48,30 @@ class ImageProcessor:
         for directory in [self.input_dir, self.inpro_dir, self.exit_dir]:
             directory.mkdir(exist_ok=True)
 
+        self.intake = ImageIntake(self.input_dir, IMAGE_EXTS, INTAKE_POLL_INTERVAL)
+        self.intake.start()
+
+        # Every batch's counts are kept, not just the latest laneN_count.txt
+        self.history = None
+        if HISTORY_DB_PATH is not None:
+            self.history = HistoryStore(HISTORY_DB_PATH, HISTORY_FLUSH_INTERVAL, HISTORY_BUFFER_SIZE)
+
     def wait_for_images(self, required=4):
         """Wait until enough images are available"""
         while True:
-            input_images = list(self.input_dir.glob("*.jpg"))
-            if len(input_images) >= required:
-                return sorted(input_images)[:required]
-            
-            print(f"Waiting for images... (have {len(input_images)}, need {required})")
-            time.sleep(5)
+            if self.intake.wait_for(required, timeout=0):
+                images = [self.intake.pop() for _ in range(required)]
+                if None not in images:
+                    return images
+                # An image vanished between queueing and use; put the rest back
+                for img in images:
+                    if img is not None:
+                        self.intake.add(img)
+                continue
+
+            print(f"Waiting for images... (have {len(self.intake)}, need {required})")
+            # Wakes as soon as enough images arrive instead of sleeping blindly
+            self.intake.wait_for(required)
 
     def process_batch(self):
         """Process one batch of 4 images"""
@@ -61,7 +87,7 @@ class ImageProcessor:
             shutil.move(str(img_path), str(dest_path))
             
             # Count vehicles
-            count = self.detector.count_vehicles(dest_path)
+            count = self.detector.count_vehicles(dest_path, lane=i)
             lane_counts.append(count)
             print(f"{lane_name}: {count} vehicles")
             
@@ -69,6 +95,9 @@ class ImageProcessor:
             with open(self.inpro_dir / f"lane{i}_count.txt", "w") as f:
                 f.write(str(count))
         
+        if self.history is not None:
+            self.history.record_counts("processor", [({}, count) for count in lane_counts])
+
         # Find busiest lane
         max_count = max(lane_counts)
         busiest_lane = lane_counts.index(max_count) + 1
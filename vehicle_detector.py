@@ -1,12 +1,24 @@
+import logging
+import threading
+from contextlib import ExitStack
 import cv2
 import torch
 # import torchvision
 # import albumentations as A  # For image augmentations
 import numpy as np
 
+from config import OPTIMIZED_INFERENCE, INFERENCE_THREADS, INFERENCE_INTEROP_THREADS, DETECTION_CONF_THRESHOLD
+from config import CASCADE_MODEL, CASCADE_UNCERTAIN_BAND, CASCADE_MAX_UNCERTAIN
+from detections import ClassWeights, Detections
+from model_registry import configure_threads, load_model
+from preprocess import LetterboxBuffers, letterbox_into, scale_boxes
+from metrics import INFERENCE_SECONDS, INFERENCE_IMAGES, INFERENCE_BATCH_SIZE, IMAGES_DECODED, CASCADE_FRAMES
+
 import warnings
 warnings.filterwarnings("ignore")
 
+logger = logging.getLogger(__name__)
+
 # def verify_setup():
 #     print("=== System Verification ===")
 #     print(f"PyTorch: {torch.__version__}")
@@ -16,10 +28,28 @@ warnings.filterwarnings("ignore")
 # Configure paths
 
 class VehicleDetector:
-    def __init__(self):
-        print("Loading YOLOv5 model on CPU...")
-        self.model = torch.hub.load('ultralytics/yolov5', 'yolov5l', pretrained=True)
-        self.model.eval()
+    def __init__(self, model_name='yolov5l', background=True, optimized=OPTIMIZED_INFERENCE, cascade=CASCADE_MODEL,
+                 min_conf=None):
+        self.model_name = model_name
+        self.optimized = optimized
+        # Lowest confidence the model reports (None keeps its built-in 0.25)
+        self.min_conf = min_conf
+        # Optimized results can differ slightly, so they are cached and
+        # reported under their own name
+        self.model_variant = f"{model_name}-optimized" if optimized else model_name
+        # Cascade: a small first-stage detector in front of this model
+        self.cascade = cascade
+        self.first_stage = None
+        self.cascade_counts = {"first_stage": 0, "uncertain": 0, "close_lanes": 0}
+        self._cascade_lock = threading.Lock()
+        if cascade:
+            self.first_stage = self._build_first_stage(cascade, background)
+            self.model_variant = f"{self.first_stage.model_variant}+{self.model_variant}"
+        self.load_error = None
+        self._model = None
+        self._ready = threading.Event()
+        # Model-size uint8 input buffers, reused across calls
+        self.buffers = LetterboxBuffers()
 
         # Class ID to weight map (vehicles only)
         self.vehicle_classes = {
@@ -34,25 +64,198 @@ class VehicleDetector:
 
         # Extract class names correctly
         self.class_names = {k: v[0] for k, v in self.vehicle_classes.items()}
+        self.class_weights = ClassWeights(self.vehicle_classes)
+
+        # Load off the caller's thread so constructing the detector never
+        # blocks; users of self.model wait until it is ready
+        if background:
+            threading.Thread(target=self._load_model, daemon=True).start()
+        else:
+            self._load_model()
+
+    def _load_model(self):
+        try:
+            logger.info(f"Loading {self.model_variant} model on CPU...")
+            configure_threads(INFERENCE_THREADS, INFERENCE_INTEROP_THREADS)
+            model = load_model(self.model_name, optimized=self.optimized)
+            model.eval()
+            if self.min_conf is not None:
+                model.conf = self.min_conf
+            self._model = model
+            self._warm_up_model()
+            if self.first_stage is not None and not self.first_stage.wait_until_ready():
+                raise RuntimeError(f"Cascade first stage {self.cascade} failed to load: {self.first_stage.load_error}")
+        except Exception as e:
+            self._model = None
+            self.load_error = str(e)
+            logger.error(f"Failed to load {self.model_name}: {e}")
+        finally:
+            self._ready.set()
+
+    def _warm_up_model(self):
+        dummy_img = torch.zeros((1, 3, 640, 640), dtype=torch.float32)
+        with self.inference_context():
+            _ = self._model(dummy_img)
+        logger.info("Model warmup complete on CPU")
+
+    def _build_first_stage(self, name, background):
+        # The first stage must report the boxes just below the threshold too,
+        # or is_uncertain never sees them
+        return VehicleDetector(
+            model_name=name,
+            background=background,
+            optimized=self.optimized,
+            cascade=None,
+            min_conf=DETECTION_CONF_THRESHOLD - CASCADE_UNCERTAIN_BAND
+        )
+
+    def inference_context(self):
+        """Autograd-free context for model calls; inference_mode in optimized mode"""
+        return torch.inference_mode() if self.optimized else torch.no_grad()
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set() and self._model is not None
+
+    def wait_until_ready(self, timeout=None):
+        """Block until loading finishes; returns True if the model is usable"""
+        self._ready.wait(timeout)
+        return self.is_ready
+
+    @property
+    def input_size(self):
+        return getattr(self.model, "input_size", 640)
+
+    @property
+    def model(self):
+        self._ready.wait()
+        if self._model is None:
+            raise RuntimeError(f"Model {self.model_name} failed to load: {self.load_error}")
+        return self._model
 
     def preprocess(self, img_path):
-        """Preprocess image for detection"""
+        """Preprocess image for detection: a square RGB float32 image at model resolution"""
         img = cv2.imread(str(img_path))  # Ensure string path
         if img is None:
-            print(f"Failed to read image: {img_path}")
+            logger.warning(f"Failed to read image: {img_path}")
             return None
 
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = img.astype('float32') / 255.0
+        # Letterbox in uint8 first so only the small image is converted
+        size = self.input_size
+        img, _, _ = letterbox_into(img, np.empty((size, size, 3), dtype=np.uint8))
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+        return img.astype('float32') / 255.0
+
+
+    def detect_batch(self, images, conf_threshold=0.20):
+        """
+        Detect vehicles in several images with a single forward pass
+
+        Args:
+            images (list): Image paths and/or already decoded BGR arrays
+            conf_threshold (float): Minimum confidence for a detection to count
+
+        Returns:
+            list: (details, weight) per input, or None where an image could not be read
+        """
+        detections = self.infer(self.load_frames(images))
+        return [None if det is None else self.summarize(det, conf_threshold) for det in detections]
+
+    def load_frames(self, images):
+        """Decode any paths in images; arrays are passed through, unreadable files become None"""
+        frames = []
+        for image in images:
+            if isinstance(image, np.ndarray):
+                frames.append(image)
+            else:
+                img = cv2.imread(str(image))
+                if img is None:
+                    logger.warning(f"Failed to read image: {image}")
+                else:
+                    IMAGES_DECODED.inc()
+                frames.append(img)
+        return frames
+
+    def infer(self, frames, escalate=False):
+        """
+        Detect vehicles in decoded BGR frames
+
+        Without a cascade this is one forward pass of this model. With one,
+        the frames go through the first stage and only uncertain frames are
+        rerun here; escalate=True skips the first stage (e.g. for lanes too
+        close to call).
+
+        Returns:
+            list: Detections per frame, None where the frame is None
+        """
+        if self.first_stage is None:
+            return self._forward(frames)
+        if escalate:
+            self._count_cascade("close_lanes", sum(img is not None for img in frames))
+            return self._forward(frames)
+
+        outputs = self.first_stage.infer(frames)
+        uncertain = [i for i, det in enumerate(outputs) if det is not None and self.is_uncertain(det)]
+        if uncertain:
+            for i, det in zip(uncertain, self._forward([frames[i] for i in uncertain])):
+                outputs[i] = det
+        self._count_cascade("first_stage", sum(det is not None for det in outputs))
+        self._count_cascade("uncertain", len(uncertain))
+        return outputs
+
+    def is_uncertain(self, detections):
+        """Too many detections close to the confidence threshold to trust a small model's count"""
+        uncertain = self.class_weights.uncertain(detections, DETECTION_CONF_THRESHOLD, CASCADE_UNCERTAIN_BAND)
+        return uncertain > CASCADE_MAX_UNCERTAIN
+
+    def _count_cascade(self, stage, n):
+        if not n:
+            return
+        with self._cascade_lock:
+            self.cascade_counts[stage] += n
+        CASCADE_FRAMES.inc(n, model=self.model_variant, stage=stage)
+
+    @property
+    def escalation_rate(self):
+        """Full-model frames per first-stage frame"""
+        with self._cascade_lock:
+            counts = dict(self.cascade_counts)
+        first = counts["first_stage"]
+        return (counts["uncertain"] + counts["close_lanes"]) / first if first else 0.0
+
+    def _forward(self, frames):
+        """One forward pass of this model over the non-None frames"""
+        outputs = [None] * len(frames)
+        valid = [i for i, img in enumerate(frames) if img is not None]
+        if not valid:
+            return outputs
+
+        # Letterbox each frame in uint8 into a reused model-size buffer (one
+        # per batch slot, i.e. per lane when scoring lanes) so nothing is
+        # allocated at camera resolution, and convert OpenCV's BGR to the RGB
+        # the model expects in place; the model normalizes the small batch
+        size = self.input_size
+        with ExitStack() as stack:
+            batch, metas = [], []
+            for slot, i in enumerate(valid):
+                buf = stack.enter_context(self.buffers.borrow(slot, size))
+                padded, ratio, pad = letterbox_into(frames[i], buf)
+                cv2.cvtColor(padded, cv2.COLOR_BGR2RGB, dst=padded)
+                batch.append(padded)
+                metas.append((ratio, pad, frames[i].shape[:2]))
+
+            with self.inference_context(), INFERENCE_SECONDS.time(model=self.model_variant):
+                results = self.model(batch)
+        INFERENCE_IMAGES.inc(len(valid), model=self.model_variant)
+        INFERENCE_BATCH_SIZE.observe(len(valid), model=self.model_variant)
 
-        h, w = img.shape[:2]
-        if h != w:
-            size = max(h, w)
-            pad_h = (size - h) // 2
-            pad_w = (size - w) // 2
-            img = np.pad(img, [(pad_h, size-h-pad_h), (pad_w, size-w-pad_w), (0, 0)], mode='constant')
+        for i, det, meta in zip(valid, results.xyxy, metas):
+            outputs[i] = Detections.from_xyxy(scale_boxes(det, *meta))
+        return outputs
 
-        return img
+    def summarize(self, detections, conf_threshold=0.20):
+        """Class counts and total weight of Detections at or above conf_threshold"""
+        return self.class_weights.summarize(detections, conf_threshold)
 
 
     # def count_vehicles(self, img_path):